@@ -0,0 +1,73 @@
+import atexit
+import os
+import threading
+import time
+import paramiko
+
+SSH_COMPRESSION = os.environ.get('DSRT_COMPRESS', '1') == '1' # zlib transport compression; set 0 to disable
+SFTP_WINDOW_SIZE = 8 * 1024 * 1024 # Large window keeps pipelined writes in flight over high-RTT WiFi links
+SFTP_MAX_PACKET_SIZE = 32768
+SFTP_CHUNK_SIZE = 32768 # One SFTP write request per chunk (paramiko's MAX_REQUEST_SIZE)
+
+# Live SSH clients keyed by (host, user) -> (client, expires_at)
+_POOL = {}
+_POOL_LOCK = threading.Lock()
+
+def _is_alive(client):
+    transport = client.get_transport()
+    return transport is not None and transport.is_active()
+
+def get_client(host, user, password, idle_timeout=30):
+    """
+    Returns a connected SSHClient for (host, user), reusing a pooled connection
+    if it is still active and has not been idle longer than idle_timeout seconds.
+    """
+    key = (host, user)
+    now = time.time()
+    with _POOL_LOCK:
+        entry = _POOL.get(key)
+        if entry:
+            client, expires_at = entry
+            if now < expires_at and _is_alive(client):
+                _POOL[key] = (client, now + idle_timeout)
+                return client
+            client.close()
+            del _POOL[key]
+
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(host, username=user, password=password, compress=SSH_COMPRESSION)
+        _POOL[key] = (client, now + idle_timeout)
+        return client
+
+def open_sftp(client):
+    """
+    Opens an SFTP channel with an enlarged flow-control window so pipelined
+    writes are not throttled waiting for window adjustments.
+    """
+    transport = client.get_transport()
+    transport.set_keepalive(30)
+    sftp = paramiko.SFTPClient.from_transport(transport, window_size=SFTP_WINDOW_SIZE, max_packet_size=SFTP_MAX_PACKET_SIZE)
+    sftp.get_channel().settimeout(None)
+    return sftp
+
+def put_pipelined(sftp, local_path, remote_path):
+    """
+    Uploads a file with pipelined writes: each chunk is sent as an async write
+    request without waiting for its ACK, and all ACKs are collected on close.
+    """
+    with open(local_path, 'rb') as fl, sftp.open(remote_path, 'wb') as fr:
+        fr.set_pipelined(True)
+        for chunk in iter(lambda: fl.read(SFTP_CHUNK_SIZE), b''):
+            fr.write(chunk)
+
+def close_all():
+    """
+    Closes every pooled connection.
+    """
+    with _POOL_LOCK:
+        for client, _ in _POOL.values():
+            client.close()
+        _POOL.clear()
+
+atexit.register(close_all)
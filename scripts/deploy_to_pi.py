@@ -1,6 +1,12 @@
-import paramiko
+import hashlib
+import json
 import os
+import shlex
 import sys
+import tarfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from connection_pool import SSH_COMPRESSION, get_client, open_sftp, put_pipelined
 
 HOSTNAME = os.environ.get('PI_HOST', '192.168.50.25') # Recommend setting via export PI_HOST=...
 USERNAME = os.environ.get('PI_USER', 'alexhudita')
@@ -12,33 +18,203 @@ if not PASSWORD:
 LOCAL_DIR = os.environ.get('LOCAL_DIR', r'C:\Users\alexh\OneDrive\Desktop\dsrt')
 REMOTE_DIR = f"/home/{USERNAME}/dsrt"
 
-def upload_dir(sftp, local_dir, remote_dir):
+# Runtime state and secrets: never overwrite the Pi's live copies
+EXCLUDED_NAMES = [
+    '.git', '__pycache__', 'behavior_report.json', 'full_incident_report.json',
+    'honeypot_logs.json', 'honeypot_logs.jsonl', 'central_logs.json', 'central_logs.jsonl',
+    'experiment_metrics.json', 'experiment_metrics.jsonl', 'experiment_report.jsonl',
+    '.metrics_cache.json', '.metrics_state.json', '.llm_cache',
+    'host.key', 'host.key.der'
+]
+MAX_UPLOAD_WORKERS = min(8, (os.cpu_count() or 1) * 2) # Stay below the Pi sshd's MaxSessions limit
+MANIFEST_NAME = '.dsrt_manifest.json' # {relative_path: [size, blake2b]} of the last successful upload
+FORCE_UPLOAD = os.environ.get('DEPLOY_FORCE', 'False').lower() == 'true' # Bypass the manifest and push everything
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def hash_file(local_path):
+    """
+    Returns [size, blake2b hex digest] for a local file, read in 1 MiB chunks.
+    """
+    digest = hashlib.blake2b()
+    size = 0
+    with open(local_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return [size, digest.hexdigest()]
+
+def load_remote_manifest(sftp, remote_dir):
+    """
+    Fetches the manifest written by the previous deploy. Returns {} if missing or unreadable.
+    """
+    try:
+        with sftp.open(f"{remote_dir}/{MANIFEST_NAME}", 'r') as f:
+            return json.loads(f.read())
+    except (IOError, ValueError):
+        return {}
+
+def collect_upload_plan(local_dir, remote_dir):
+    """
+    Walks the local tree once and returns (remote_dirs, files) where files is a
+    list of (local_path, remote_path) tuples. Directories are listed parent-first.
+    Uses the file type cached on each DirEntry so no extra stat calls are made.
+    """
+    remote_dirs = [remote_dir]
+    files = []
+    pending = [(local_dir, remote_dir)]
+    while pending:
+        current_local, current_remote = pending.pop()
+        with os.scandir(current_local) as it:
+            for entry in it:
+                if entry.name in EXCLUDED_NAMES:
+                    continue
+                remote_path = f"{current_remote}/{entry.name}"
+                if entry.is_file(follow_symlinks=False):
+                    files.append((entry.path, remote_path))
+                elif entry.is_dir(follow_symlinks=False):
+                    remote_dirs.append(remote_path)
+                    pending.append((entry.path, remote_path))
+    return remote_dirs, files
+
+def remote_has_tar(client):
+    """
+    Returns True if the remote host can extract a tar stream from stdin.
+    """
+    stdin, stdout, stderr = client.exec_command('command -v tar')
+    return stdout.channel.recv_exit_status() == 0
+
+def upload_tar(client, files, remote_dir):
+    """
+    Streams all (local_path, rel_path) files as a single tar over one SSH exec
+    channel, paying no per-file round trips. Returns True on success.
+    The tar is only gzipped when the SSH transport is not already compressing,
+    so neither end compresses the same bytes twice.
+    """
+    quoted_dir = shlex.quote(remote_dir)
+    gzip = not SSH_COMPRESSION
+    stdin, stdout, stderr = client.exec_command(f"mkdir -p {quoted_dir} && tar -x{'z' if gzip else ''}f - -C {quoted_dir}")
+    try:
+        with tarfile.open(fileobj=stdin, mode='w|gz' if gzip else 'w|') as tar:
+            for local_path, rel_path in files:
+                print(f"Packing {local_path} -> {remote_dir}/{rel_path}")
+                tar.add(local_path, arcname=rel_path, recursive=False)
+    finally:
+        stdin.channel.shutdown_write()
+    status = stdout.channel.recv_exit_status()
+    if status != 0:
+        print(f"Remote tar extraction failed ({status}): {stderr.read().decode('utf-8', errors='replace')}")
+        return False
+    return True
+
+def upload_sftp(client, remote_dirs, files, remote_dir):
+    """
+    Fallback for hosts without tar. Directories are created serially on one SFTP
+    channel, then files are transferred concurrently with one SFTP channel per worker
+    thread (paramiko channels are not safe to share across threads).
+    Returns the set of rel_paths that failed.
+    """
+    sftp = open_sftp(client)
     try:
-        sftp.mkdir(remote_dir)
-    except IOError:
-        pass # Directory likely exists
-
-    for item in os.listdir(local_dir):
-        if item in ['.git', '__pycache__', 'behavior_report.json', 'honeypot_logs.json', 'experiment_metrics.json']:
-            continue
-        local_path = os.path.join(local_dir, item)
-        remote_path = f"{remote_dir}/{item}"
-
-        if os.path.isfile(local_path):
-            print(f"Uploading {local_path} -> {remote_path}")
-            sftp.put(local_path, remote_path)
-        elif os.path.isdir(local_path):
-            upload_dir(sftp, local_path, remote_path)
+        for path in remote_dirs:
+            try:
+                sftp.mkdir(path)
+            except IOError:
+                pass # Directory likely exists
+    finally:
+        sftp.close()
+
+    local = threading.local()
+    channels = []
+    channels_lock = threading.Lock()
+
+    def upload_file(local_path, rel_path):
+        if not hasattr(local, 'sftp'):
+            local.sftp = open_sftp(client)
+            with channels_lock:
+                channels.append(local.sftp)
+        remote_path = f"{remote_dir}/{rel_path}"
+        print(f"Uploading {local_path} -> {remote_path}")
+        try:
+            put_pipelined(local.sftp, local_path, remote_path)
+            return None
+        except Exception as e:
+            print(f"Failed to upload {local_path}: {e}")
+            return rel_path
+
+    try:
+        with ThreadPoolExecutor(max_workers=MAX_UPLOAD_WORKERS) as executor:
+            failed = set(executor.map(lambda f: upload_file(*f), files))
+    finally:
+        for channel in channels:
+            channel.close()
+    failed.discard(None)
+    return failed
+
+def upload_dir(client, local_dir, remote_dir):
+    """
+    Uploads the files of local_dir that changed since the last deploy to remote_dir,
+    as one tar stream when the remote has tar, otherwise over parallel SFTP channels.
+    Raises IOError if any file failed, so a partially updated tree is never deployed.
+    """
+    remote_dirs, files = collect_upload_plan(local_dir, remote_dir)
+    prefix_len = len(remote_dir) + 1
+
+    remote_manifest = {}
+    if not FORCE_UPLOAD:
+        sftp = open_sftp(client)
+        try:
+            remote_manifest = load_remote_manifest(sftp, remote_dir)
+        finally:
+            sftp.close()
+
+    # Hash in parallel: hashlib releases the GIL on large buffers
+    with ThreadPoolExecutor(max_workers=MAX_UPLOAD_WORKERS) as executor:
+        entries = list(executor.map(lambda f: hash_file(f[0]), files))
+
+    manifest = {}
+    changed = []
+    for (local_path, remote_path), entry in zip(files, entries):
+        rel_path = remote_path[prefix_len:]
+        manifest[rel_path] = entry
+        if remote_manifest.get(rel_path) != entry:
+            changed.append((local_path, rel_path))
+
+    print(f"{len(changed)} changed files, {len(files) - len(changed)} unchanged.")
+    if not changed:
+        return
+
+    if remote_has_tar(client):
+        failed = set() if upload_tar(client, changed, remote_dir) else {rel_path for _, rel_path in changed}
+    else:
+        failed = upload_sftp(client, remote_dirs, changed, remote_dir)
+
+    # Failed files are left out of the manifest so the next deploy retries them
+    for rel_path in failed:
+        manifest.pop(rel_path, None)
+    sftp = open_sftp(client)
+    try:
+        with sftp.open(f"{remote_dir}/{MANIFEST_NAME}", 'w') as f:
+            f.write(json.dumps(manifest))
+    except IOError as e:
+        print(f"Failed to write upload manifest: {e}")
+    finally:
+        sftp.close()
+
+    if failed:
+        raise IOError(f"{len(failed)} of {len(changed)} files failed to upload")
 
 def connect_and_deploy():
-    client = paramiko.SSHClient()
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
     print(f"Connecting to {HOSTNAME}...")
     try:
-        client.connect(HOSTNAME, username=USERNAME, password=PASSWORD)
-        sftp = client.open_sftp()
+        client = get_client(HOSTNAME, USERNAME, PASSWORD)
         print("Uploading project files...")
-        upload_dir(sftp, LOCAL_DIR, REMOTE_DIR)
+        upload_dir(client, LOCAL_DIR, REMOTE_DIR)
+
+        # host.key is never uploaded: the Pi keeps its own, generated on the first deploy
+        quoted_key = shlex.quote(f"{REMOTE_DIR}/host.key")
+        stdin, stdout, stderr = client.exec_command(f"test -f {quoted_key} || ssh-keygen -q -t rsa -b 2048 -m PEM -N '' -f {quoted_key}")
+        if stdout.channel.recv_exit_status() != 0:
+            raise IOError(f"Could not create the Pi's host key: {stderr.read().decode('utf-8', errors='replace')}")
         
         print("Executing Docker Compose...")
         stdin, stdout, stderr = client.exec_command(f'cd {REMOTE_DIR} && sudo docker compose up --build -d')
@@ -50,9 +226,6 @@ def connect_and_deploy():
         print("Success! Honeypot deployed to the Raspberry Pi.")
     except Exception as e:
         print(f"Deployment failed: {e}")
-    finally:
-        if 'sftp' in locals(): sftp.close()
-        client.close()
 
 if __name__ == '__main__':
     connect_and_deploy()
@@ -1,31 +1,28 @@
-import paramiko
 import json
+import os
 import random
+import sys
 from datetime import datetime, timedelta
+from connection_pool import get_client, open_sftp, put_pipelined
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from geo import geo_lookup
 
 HOSTNAME = os.environ.get('PI_HOST', '192.168.50.25')
 USERNAME = os.environ.get('PI_USER', 'alexhudita')
 PASSWORD = os.environ.get('PI_PASSWORD')
 if not PASSWORD:
     print("Error: PI_PASSWORD environment variable is required to run this script.")
-    import sys
     sys.exit(1)
     
-REMOTE_METRICS_PATH = f'/home/{USERNAME}/dsrt/logs/experiment_metrics.json'
+REMOTE_METRICS_PATH = f'/home/{USERNAME}/dsrt/logs/experiment_metrics.jsonl'
 
-GEO_MAPPINGS = [
-    {"ip": "89.20.14.5", "geo": {"country": "Netherlands", "city": "Amsterdam", "isp": "KPN"}},
-    {"ip": "185.10.24.8", "geo": {"country": "Russia", "city": "Moscow", "isp": "Rostelecom"}},
-    {"ip": "114.55.10.2", "geo": {"country": "China", "city": "Nanjing", "isp": "China Telecom"}},
-    {"ip": "177.34.1.99", "geo": {"country": "Brazil", "city": "Sao Paulo", "isp": "Vivo"}},
-    {"ip": "54.12.99.1", "geo": {"country": "USA", "city": "Ashburn", "isp": "Amazon AWS"}},
-    {"ip": "192.168.50.253", "geo": {"country": "Germany", "city": "Frankfurt", "isp": "Local Testnet Node"}},
-    {"ip": "80.20.14.5", "geo": {"country": "UK", "city": "London", "isp": "BT"}},
-    {"ip": "118.10.24.8", "geo": {"country": "South Korea", "city": "Seoul", "isp": "KT"}},
-    {"ip": "104.55.10.2", "geo": {"country": "South Africa", "city": "Cape Town", "isp": "Vodacom"}},
-    {"ip": "13.34.1.99", "geo": {"country": "India", "city": "Mumbai", "isp": "Jio"}},
-    {"ip": "82.12.99.1", "geo": {"country": "Romania", "city": "Bucharest", "isp": "Orange"}}
+# One sample attacker per mock region; locations come from the controller's shared table
+MOCK_ATTACKER_IPS = [
+    "89.20.14.5", "185.10.24.8", "114.55.10.2", "177.34.1.99", "54.12.99.1", "192.168.50.253",
+    "80.20.14.5", "118.10.24.8", "104.55.10.2", "13.34.1.99", "82.12.99.1",
 ]
+GEO_MAPPINGS = [{"ip": ip, "geo": geo_lookup(ip)} for ip in MOCK_ATTACKER_IPS]
 
 COMMANDS = [
     {"cmd": "ls -la", "action": "ALLOW", "risk": 15, "reason": "Standard reconnaissance command. Allowed for intelligence gathering."},
@@ -39,17 +36,22 @@ COMMANDS = [
     {"cmd": "cat ~/.ssh/id_rsa", "action": "BLOCK", "risk": 90, "reason": "Private SSH key exfiltration attempt. Sensitive credential access blocked."},
 ]
 
-def generate_mock_data():
+def generate_mock_data(n=40):
     events = []
     base_time = datetime.now() - timedelta(minutes=30)
+
+    # Draw every per-event choice up front in single C-level calls
+    mappings = random.choices(GEO_MAPPINGS, k=n)
+    cmd_templates = random.choices(COMMANDS, k=n)
+    # isoformat(' ', 'seconds') yields the same "%Y-%m-%d %H:%M:%S" text via C fast path, far cheaper than strftime
+    timestamps = [(base_time + timedelta(seconds=i*45)).isoformat(' ', 'seconds') for i in range(n)]
     
-    for i in range(40):
-        mapping = random.choice(GEO_MAPPINGS)
+    for i, (mapping, cmd_template) in enumerate(zip(mappings, cmd_templates)):
         
         # 10% chance of being a disconnect event
         if random.random() < 0.10:
             events.append({
-                "timestamp": (base_time + timedelta(seconds=i*45)).strftime("%Y-%m-%d %H:%M:%S"),
+                "timestamp": timestamps[i],
                 "attacker_ip": mapping["ip"],
                 "geolocation": mapping["geo"],
                 "command": "CONNECTION TERMINATED",
@@ -61,9 +63,8 @@ def generate_mock_data():
             })
             continue
 
-        cmd_template = random.choice(COMMANDS)
         events.append({
-            "timestamp": (base_time + timedelta(seconds=i*45)).strftime("%Y-%m-%d %H:%M:%S"),
+            "timestamp": timestamps[i],
             "attacker_ip": mapping["ip"],
             "geolocation": mapping["geo"],
             "command": cmd_template["cmd"],
@@ -77,19 +78,18 @@ def generate_mock_data():
 
 def populate_pi():
     data = generate_mock_data()
-    local_path = 'mock_metrics.json'
+    local_path = 'mock_metrics.jsonl'
     
+    # The controller's intelligence feed is JSONL: one event per line
     with open(local_path, 'w') as f:
-        json.dump(data, f, indent=4)
+        f.writelines(json.dumps(event) + '\n' for event in data)
         
-    client = paramiko.SSHClient()
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
     print(f"Connecting to {HOSTNAME}...")
     try:
-        client.connect(HOSTNAME, username=USERNAME, password=PASSWORD)
-        sftp = client.open_sftp()
+        client = get_client(HOSTNAME, USERNAME, PASSWORD)
+        sftp = open_sftp(client)
         print(f"Uploading mock data to temp dir...")
-        sftp.put(local_path, '/home/alexhudita/tmp_metrics.json')
+        put_pipelined(sftp, local_path, '/home/alexhudita/tmp_metrics.json')
         print(f"Escalating privileges to overwrite Docker volume at {REMOTE_METRICS_PATH}...")
         stdin, stdout, stderr = client.exec_command(f'sudo mv /home/alexhudita/tmp_metrics.json {REMOTE_METRICS_PATH}')
         print(stdout.read().decode())
@@ -98,8 +98,6 @@ def populate_pi():
         print(f"Failed to upload: {e}")
     finally:
         if 'sftp' in locals(): sftp.close()
-        client.close()
-        import os
         if os.path.exists(local_path):
             os.remove(local_path)
 
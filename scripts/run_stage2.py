@@ -1,13 +1,15 @@
-import json
+import hashlib
 import logging
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 # Add src/ to path so we can import from there
 _ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, os.path.join(_ROOT, 'src'))
 
-from llm_interface import LLMInterface
+from llm_interface import LLMInterface, ANALYSIS_FALLBACK, ANALYSIS_PROMPT_VERSION
+from json_utils import dumps, load_file, dump_file
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -15,6 +17,43 @@ logger = logging.getLogger(__name__)
 
 INPUT_FILE = os.path.join(_ROOT, 'logs', 'behavior_report.json')
 OUTPUT_FILE = os.path.join(_ROOT, 'logs', 'full_incident_report.json')
+CACHE_DIR = os.path.join(_ROOT, 'logs', '.llm_cache') # Content-addressed LLM analyses, one file per profile hash
+LLM_CONCURRENCY = int(os.environ.get('LLM_CONCURRENCY', '8')) # Keep low enough not to overload local Ollama
+
+def profile_key(llm, profile):
+    """
+    Hashes the normalized fields the LLM sees, so identical profiles from
+    different IPs (e.g. one botnet template) map to the same key. The model
+    and prompt version are part of the key, so changing either re-analyzes.
+    The IP is deliberately left out: an analysis shared between IPs comes from
+    a prompt that named whichever IP was analyzed first, so its free-text
+    summary may cite that address rather than this one.
+    """
+    summary = llm.summarize_profile(profile)
+    for field in ('unique_usernames', 'unique_passwords'):
+        summary[field] = sorted(summary[field] or [])
+    key = {"model": llm.model_name, "prompt_version": ANALYSIS_PROMPT_VERSION, "profile": summary}
+    return hashlib.blake2b(dumps(key, sort_keys=True), digest_size=16).hexdigest()
+
+def cached_analysis(llm, key, ip, profile):
+    """
+    Returns the cached analysis for key, or queries the LLM and caches a successful result.
+    """
+    cache_path = os.path.join(CACHE_DIR, f"{key}.json")
+    if os.path.exists(cache_path):
+        try:
+            return load_file(cache_path)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable cache entry {cache_path}: {e}")
+
+    logger.info(f"Analyzing IP: {ip}")
+    analysis = llm.analyze_profile(ip, profile)
+    if analysis != ANALYSIS_FALLBACK:
+        try:
+            dump_file(analysis, cache_path)
+        except Exception as e:
+            logger.warning(f"Failed to cache analysis for {ip}: {e}")
+    return analysis
 
 def main():
     if not os.path.exists(INPUT_FILE):
@@ -23,8 +62,7 @@ def main():
 
     # Load Stage 1 Report
     try:
-        with open(INPUT_FILE, 'r') as f:
-            report = json.load(f)
+        report = load_file(INPUT_FILE)
     except Exception as e:
         logger.error(f"Failed to load report: {e}")
         return
@@ -39,21 +77,31 @@ def main():
 
     enriched_report = {}
     
-    logger.info(f"Starting LLM analysis for {len(report)} attackers...")
+    logger.info(f"Starting LLM analysis for {len(report)} attackers ({LLM_CONCURRENCY} concurrent requests)...")
     
-    for ip, profile in report.items():
-        logger.info(f"Analyzing IP: {ip}")
-        try:
-            enriched_profile = llm.analyze_attacker(ip, profile)
-            enriched_report[ip] = enriched_profile
-        except Exception as e:
-            logger.error(f"Error analyzing {ip}: {e}")
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    keys = {ip: profile_key(llm, profile) for ip, profile in report.items()}
+    logger.info(f"{len(set(keys.values()))} distinct profiles to analyze.")
+
+    # Requests are I/O-bound on the model server, so overlap them with a bounded pool.
+    # Identical profiles share one future, so each distinct profile costs at most one LLM call.
+    with ThreadPoolExecutor(max_workers=LLM_CONCURRENCY) as executor:
+        futures = {}
+        for ip, profile in report.items():
+            key = keys[ip]
+            if key not in futures:
+                futures[key] = executor.submit(cached_analysis, llm, key, ip, profile)
+        # Collect in report order so the output file keeps the input ordering
+        for ip, profile in report.items():
+            try:
+                profile.update(futures[keys[ip]].result())
+            except Exception as e:
+                logger.error(f"Error analyzing {ip}: {e}")
             enriched_report[ip] = profile # Keep original data even if LLM fails
 
     # Save Output
     try:
-        with open(OUTPUT_FILE, 'w') as f:
-            json.dump(enriched_report, f, indent=4)
+        dump_file(enriched_report, OUTPUT_FILE)
         logger.info(f"Full incident report saved to {OUTPUT_FILE}")
     except Exception as e:
         logger.error(f"Failed to save output: {e}")
@@ -1,7 +1,12 @@
 import json
 import os
 import logging
+from collections import defaultdict
 from datetime import datetime
+from itertools import chain
+from operator import itemgetter
+
+from json_utils import iter_records, dump_file
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -9,7 +14,7 @@ logger = logging.getLogger(__name__)
 
 # Configuration Constants
 _LOGS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs')
-LOG_FILE = os.path.join(_LOGS_DIR, 'honeypot_logs.json')
+LOG_FILE = os.path.join(_LOGS_DIR, 'honeypot_logs.jsonl')
 REPORT_FILE = os.path.join(_LOGS_DIR, 'behavior_report.json')
 
 # Scoring Configuration
@@ -23,17 +28,36 @@ RISK_SCORE_CAP = 100
 
 ADMIN_USERNAMES = {'root', 'admin', 'administrator', 'sysadmin'}
 
+def parse_epoch(timestamp_str):
+    """
+    Converts an ISO timestamp string to epoch seconds. Returns 0.0 if missing or invalid.
+    """
+    if not timestamp_str:
+        return 0.0
+    try:
+        return datetime.fromisoformat(timestamp_str).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
 class LogAnalyzer:
     """
-    Processes honeypot_logs.json and extracts attacker behavioral insights.
+    Processes honeypot_logs.jsonl and extracts attacker behavioral insights.
     """
 
     def __init__(self, log_file=LOG_FILE):
         self.log_file = log_file
 
+    def iter_logs(self):
+        """
+        Streams events from honeypot_logs.jsonl (JSON array or one JSON object per line).
+        """
+        for event in iter_records(self.log_file):
+            if isinstance(event, dict):
+                yield event
+
     def load_logs(self):
         """
-        Loads honeypot_logs.json.
+        Loads honeypot_logs.jsonl.
         Handles missing or corrupted files with proper error messages.
         Returns:
             list of dicts: Raw log events
@@ -43,12 +67,7 @@ class LogAnalyzer:
             return []
 
         try:
-            with open(self.log_file, 'r') as f:
-                logs = json.load(f)
-                if not isinstance(logs, list):
-                    logger.error("Invalid log format: Root element must be a list.")
-                    return []
-                return logs
+            return list(self.iter_logs())
         except json.JSONDecodeError as e:
             logger.error(f"Failed to decode JSON logs: {e}")
             return []
@@ -58,120 +77,175 @@ class LogAnalyzer:
 
     def group_by_ip(self, logs):
         """
-        Aggregates events by source IP.
+        Aggregates events by source IP. Accepts any iterable of events.
         Returns:
             dict: {ip_address: [list of events]}
         """
-        grouped = {}
+        grouped = defaultdict(list)
         for event in logs:
             ip = event.get('ip')
-            if not ip:
-                continue
-            if ip not in grouped:
-                grouped[ip] = []
-            grouped[ip].append(event)
-        return grouped
+            if ip:
+                grouped[ip].append(event)
+        return dict(grouped)
 
-    def analyze_session(self, ip, events):
+    def summarize_session(self, events, summary=None):
         """
-        Analyze events for a single IP.
-        
-        Extract metrics, detect patterns, and compute risk score.
+        Folds events into a session summary: first/last event, unique usernames
+        and passwords, and the login attempt count. Passing the summary of
+        earlier events extends it, with the same result as summarizing all the
+        events at once. Returns None if there are no events and no summary.
         """
-        if not events:
-            return None
+        return self._summarize_timed(((parse_epoch(e.get('timestamp')), e) for e in events), summary)
 
-        # Sort events by timestamp
-        try:
-            sorted_events = sorted(events, key=lambda x: x.get('timestamp', ''))
-        except Exception:
-            sorted_events = events
+    def _summarize_timed(self, timed_events, summary=None):
+        """
+        summarize_session over (epoch, event) pairs whose epochs are already parsed.
+        """
+        timed_events = iter(timed_events)
+        if summary is None:
+            first = next(timed_events, None)
+            if first is None:
+                return None
+            ts, e = first
+            summary = {
+                'first_ts': ts, 'first_seen': e.get('timestamp'),
+                'last_ts': ts, 'last_seen': e.get('timestamp'),
+                'usernames': set(), 'passwords': set(), 'total_attempts': 0
+            }
+            timed_events = chain((first,), timed_events)
+
+        # Ties keep the same first/last events a stable sort would.
+        first_ts = summary['first_ts']
+        last_ts = summary['last_ts']
+        usernames = summary['usernames']
+        passwords = summary['passwords']
+        total_attempts = summary['total_attempts']
+        for ts, e in timed_events:
+            if ts < first_ts:
+                first_ts = ts
+                summary['first_seen'] = e.get('timestamp')
+            if ts >= last_ts:
+                last_ts = ts
+                summary['last_seen'] = e.get('timestamp')
+            username = e.get('username')
+            if username:
+                usernames.add(username)
+            password = e.get('password')
+            if password:
+                passwords.add(password)
+            if e.get('event_type') == 'LOGIN_ATTEMPT':
+                total_attempts += 1
+        summary['first_ts'] = first_ts
+        summary['last_ts'] = last_ts
+        summary['total_attempts'] = total_attempts
+        return summary
+
+    def score_session(self, summary):
+        """
+        Detects patterns and computes the risk score from a session summary.
+        """
+        first_ts = summary['first_ts']
+        last_ts = summary['last_ts']
+        usernames = summary['usernames']
+        passwords = summary['passwords']
+        total_attempts = summary['total_attempts']
 
         # Basic Metrics
-        first_event = sorted_events[0]
-        last_event = sorted_events[-1]
-        
-        first_seen_str = first_event.get('timestamp')
-        last_seen_str = last_event.get('timestamp')
-        
-        try:
-            first_seen_dt = datetime.fromisoformat(first_seen_str)
-            last_seen_dt = datetime.fromisoformat(last_seen_str)
-            duration = (last_seen_dt - first_seen_dt).total_seconds()
-        except ValueError:
+        if first_ts and last_ts:
+            duration = last_ts - first_ts
+        else:
             duration = 0
-
-        usernames = {e.get('username') for e in sorted_events if e.get('username')}
-        passwords = {e.get('password') for e in sorted_events if e.get('password')}
-        
-        total_attempts = sum(1 for e in sorted_events if e.get('event_type') == 'LOGIN_ATTEMPT')
         
         # Pattern Detection & Scoring
-        patterns = []
-        score_details = {}
-        risk_score = 0
-        
+        num_usernames = len(usernames)
+        num_passwords = len(passwords)
+
         # 1. Base Score
         base_points = total_attempts * BASE_SCORE_PER_ATTEMPT
-        risk_score += base_points
-        score_details['base_attempt_points'] = base_points
 
         # 2. High Velocity
         # Simple check: attempts / duration (in mins). If duration < 60s, checking raw count might be safer.
         # Strict logic: calculate max attempts in any sliding 60s window would be better, but simple average for now.
         duration_minutes = max(duration / 60.0, 1.0) # avoid div by zero
-        attempts_per_min = total_attempts / duration_minutes
-        
-        if attempts_per_min > HIGH_VELOCITY_THRESHOLD:
-            patterns.append('high_velocity')
-            risk_score += HIGH_VELOCITY_SCORE
-            score_details['high_velocity_bonus'] = HIGH_VELOCITY_SCORE
+        high_velocity = total_attempts / duration_minutes > HIGH_VELOCITY_THRESHOLD
 
-        # 3. Admin Targeting
-        if any(u.lower() in ADMIN_USERNAMES for u in usernames):
-            patterns.append('admin_targeting')
-            risk_score += ADMIN_TARGETING_SCORE
-            score_details['admin_targeting_bonus'] = ADMIN_TARGETING_SCORE
+        # 3. Admin Targeting (single C-level set intersection)
+        admin_targeting = not ADMIN_USERNAMES.isdisjoint({u.lower() for u in usernames})
 
         # 4. Credential Stuffing (Many Passwords, Few Usernames)
-        if len(usernames) == 1 and len(passwords) > 3:
-            patterns.append('credential_stuffing')
-            risk_score += CREDENTIAL_STUFFING_SCORE
-            score_details['credential_stuffing_bonus'] = CREDENTIAL_STUFFING_SCORE
-
-        # 5. Brute Force (Many Usernames OR Many Passwords)
-        if len(usernames) > 3 or len(passwords) > 5:
-            if 'credential_stuffing' not in patterns: # don't double count usually, but let's keep it simple
-                patterns.append('brute_force')
-                risk_score += BRUTE_FORCE_SCORE
-                score_details['brute_force_bonus'] = BRUTE_FORCE_SCORE
+        credential_stuffing = num_usernames == 1 and num_passwords > 3
+
+        # 5. Brute Force (Many Usernames OR Many Passwords), not double counted with stuffing
+        brute_force = (num_usernames > 3 or num_passwords > 5) and not credential_stuffing
+
+        patterns = []
+        score_details = {'base_attempt_points': base_points}
+        for pattern, matched, bonus in (
+            ('high_velocity', high_velocity, HIGH_VELOCITY_SCORE),
+            ('admin_targeting', admin_targeting, ADMIN_TARGETING_SCORE),
+            ('credential_stuffing', credential_stuffing, CREDENTIAL_STUFFING_SCORE),
+            ('brute_force', brute_force, BRUTE_FORCE_SCORE),
+        ):
+            if matched:
+                patterns.append(pattern)
+                score_details[f'{pattern}_bonus'] = bonus
 
         # Cap Score
-        risk_score = min(risk_score, RISK_SCORE_CAP)
+        risk_score = min(sum(score_details.values()), RISK_SCORE_CAP)
 
         return {
-            "first_seen": first_seen_str,
-            "last_seen": last_seen_str,
+            "first_seen": summary['first_seen'],
+            "last_seen": summary['last_seen'],
             "duration": round(duration, 2),
             "total_attempts": total_attempts,
             "unique_usernames": list(usernames),
             "unique_passwords": list(passwords),
             "patterns": patterns,
             "risk_score": risk_score,
-            "score_details": score_details,
-            "events": sorted_events
+            "score_details": score_details
         }
 
+    def analyze_session(self, ip, events, include_events=True):
+        """
+        Analyze events for a single IP.
+        
+        Extract metrics, detect patterns, and compute risk score.
+        The time-ordered event list is only built when include_events is True.
+        """
+        if not events:
+            return None
+
+        # Each timestamp is parsed once, for both the summary and the ordering;
+        # the events themselves are left untouched
+        timed_events = [(parse_epoch(e.get('timestamp')), e) for e in events]
+        analysis = self.score_session(self._summarize_timed(timed_events))
+        if include_events:
+            # Stable sort on the epoch alone; events with equal epochs keep log order
+            analysis["events"] = [e for _, e in sorted(timed_events, key=itemgetter(0))]
+        return analysis
+
     def generate_report(self):
         """
         Outputs behavior_report.json with profiles for each IP.
         """
-        logs = self.load_logs()
-        if not logs:
+        if not os.path.exists(self.log_file):
+            logger.error(f"Log file not found: {self.log_file}")
+            return
+
+        # Group straight from the event stream instead of materializing the raw log list first
+        try:
+            grouped = self.group_by_ip(self.iter_logs())
+        except json.JSONDecodeError as e:
+            logger.error(f"Failed to decode JSON logs: {e}")
+            return
+        except Exception as e:
+            logger.error(f"Error loading logs: {e}")
+            return
+
+        if not grouped:
             logger.warning("No logs to analyze.")
             return
 
-        grouped = self.group_by_ip(logs)
         report = {}
 
         for ip, events in grouped.items():
@@ -180,8 +254,7 @@ class LogAnalyzer:
                 report[ip] = analysis
 
         try:
-            with open(REPORT_FILE, 'w') as f:
-                json.dump(report, f, indent=4)
+            dump_file(report, REPORT_FILE)
             logger.info(f"Report generated: {REPORT_FILE}")
         except Exception as e:
             logger.error(f"Failed to write report: {e}")
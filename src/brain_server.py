@@ -1,7 +1,9 @@
+import glob
 import os
 import sys
-import json
 import logging
+import threading
+import time
 import psutil
 try:
     import pynvml
@@ -10,12 +12,13 @@ try:
 except Exception:
     HAS_NVML = False
 
-from flask import Flask, request, jsonify
+from flask import Flask, request
 from flask_cors import CORS
 
 # Ensure src/ siblings are importable regardless of CWD
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from llm_interface import LLMInterface
+from json_utils import json_response, read_request_json
 
 # Configure Logging
 logging.basicConfig(
@@ -31,39 +34,126 @@ CORS(app)
 # Initialize LLM Interface to Mistral API
 llm = LLMInterface()
 
-@app.route('/telemetry', methods=['GET'])
-def get_telemetry():
+TELEMETRY_INTERVAL = 0.5 # Seconds between hardware samples
+BRAIN_THREADS = int(os.environ.get('BRAIN_THREADS', '16')) # Concurrent requests (LLM calls are I/O-bound)
+
+DEFAULT_CPU_TEMP = 45.0 # Realistic fallback when no sensor is exposed (e.g. Windows)
+HWMON_CPU_SENSORS = ('coretemp', 'k10temp', 'cpu_thermal')
+THERMAL_ZONE_PATH = '/sys/class/thermal/thermal_zone0/temp' # Raspberry Pi SoC sensor
+
+def find_cpu_temp_file():
     """
-    Returns real hardware metrics of the host PC running the Brain Server.
-    Used by the dashboard for live hardware monitoring.
+    Locates the sysfs file of the first known CPU sensor, or None if there is none.
     """
-    cpu_percent = psutil.cpu_percent(interval=0.1)
-    ram = psutil.virtual_memory()
-    ram_percent = ram.percent
-    
-    # Try to grab CPU temp if supported (rarely supported on Windows natively via psutil, so we mock a realistic fallback if none)
-    cpu_temp = 45.0
+    for hwmon in sorted(glob.glob('/sys/class/hwmon/hwmon*')):
+        try:
+            with open(os.path.join(hwmon, 'name')) as f:
+                name = f.read().strip()
+        except OSError:
+            continue
+        if name in HWMON_CPU_SENSORS:
+            inputs = sorted(glob.glob(os.path.join(hwmon, 'temp*_input')))
+            if inputs:
+                return inputs[0]
+    if os.path.exists(THERMAL_ZONE_PATH):
+        return THERMAL_ZONE_PATH
+    return None
+
+def build_temp_reader():
+    """
+    Probes the CPU temperature source once and returns a zero-argument reader,
+    so each sample reads a single sysfs file instead of every psutil sensor.
+    """
+    path = find_cpu_temp_file()
+    if path:
+        def read_sysfs():
+            with open(path) as f:
+                return int(f.read()) / 1000.0
+        return read_sysfs
+
+    # Non-sysfs platforms where psutil still exposes coretemp
     if hasattr(psutil, "sensors_temperatures"):
         temps = psutil.sensors_temperatures()
         if temps and 'coretemp' in temps:
-            cpu_temp = temps['coretemp'][0].current
+            return lambda: psutil.sensors_temperatures()['coretemp'][0].current
+
+    return lambda: DEFAULT_CPU_TEMP
 
-    # Try to grab Nvidia GPU usage
-    gpu_percent = 0.0
-    if HAS_NVML:
+class TelemetrySampler(threading.Thread):
+    """
+    Samples host hardware metrics in the background so /telemetry never blocks.
+    """
+    def __init__(self, interval=TELEMETRY_INTERVAL):
+        super().__init__()
+        self.daemon = True
+        self.running = True
+        self.interval = interval
+        self.read_temp = build_temp_reader()
+        self.gpu_handle = None
+        if HAS_NVML:
+            try:
+                self.gpu_handle = pynvml.nvmlDeviceGetHandleByIndex(0)
+            except Exception as e:
+                logger.error(f"Failed to get NVML handle: {e}")
+        # Prime cpu_percent so the first non-blocking call returns a real delta
+        psutil.cpu_percent(interval=None)
+        self.snapshot = self.sample()
+        self.start_lock = threading.Lock()
+
+    def ensure_started(self):
+        """
+        Starts sampling once, whether the app runs under serve(), an external
+        WSGI server (waitress-serve, gunicorn) or a test client.
+        """
+        with self.start_lock:
+            if self.ident is None:
+                self.start()
+
+    def sample(self):
+        cpu_percent = psutil.cpu_percent(interval=None)
+        ram_percent = psutil.virtual_memory().percent
+
+        # CPU temp source was probed once at startup (mocked fallback if the host exposes none)
         try:
-            handle = pynvml.nvmlDeviceGetHandleByIndex(0)
-            util = pynvml.nvmlDeviceGetUtilizationRates(handle)
-            gpu_percent = float(util.gpu)
-        except Exception as e:
-            logger.error(f"Failed to read NVML: {e}")
-
-    return jsonify({
-        "cpu": cpu_percent,
-        "ram": ram_percent,
-        "temp": cpu_temp,
-        "gpu": gpu_percent
-    }), 200
+            cpu_temp = self.read_temp()
+        except Exception:
+            cpu_temp = DEFAULT_CPU_TEMP
+
+        # Try to grab Nvidia GPU usage
+        gpu_percent = 0.0
+        if self.gpu_handle is not None:
+            try:
+                util = pynvml.nvmlDeviceGetUtilizationRates(self.gpu_handle)
+                gpu_percent = float(util.gpu)
+            except Exception as e:
+                logger.error(f"Failed to read NVML: {e}")
+
+        return {
+            "cpu": cpu_percent,
+            "ram": ram_percent,
+            "temp": cpu_temp,
+            "gpu": gpu_percent
+        }
+
+    def run(self):
+        while self.running:
+            time.sleep(self.interval)
+            try:
+                # Rebinding the attribute is atomic, readers always see a complete snapshot
+                self.snapshot = self.sample()
+            except Exception as e:
+                logger.error(f"Telemetry sampling failed: {e}")
+
+telemetry_sampler = TelemetrySampler()
+
+@app.route('/telemetry', methods=['GET'])
+def get_telemetry():
+    """
+    Returns real hardware metrics of the host PC running the Brain Server.
+    Used by the dashboard for live hardware monitoring.
+    """
+    telemetry_sampler.ensure_started()
+    return json_response(telemetry_sampler.snapshot, 200)
 
 @app.route('/analyze', methods=['POST'])
 def analyze_threat():
@@ -71,15 +161,15 @@ def analyze_threat():
     Receives attacker profile from a sensor (Raspberry Pi),
     queries the Cloud LLM, and returns an actionable decision.
     """
-    data = request.json
+    data = read_request_json(request)
     if not data:
-        return jsonify({"error": "No JSON payload provided"}), 400
+        return json_response({"error": "No JSON payload provided"}, 400)
 
     ip = data.get("ip")
     profile = data.get("profile")
 
     if not ip or not profile:
-        return jsonify({"error": "Missing 'ip' or 'profile' in payload"}), 400
+        return json_response({"error": "Missing 'ip' or 'profile' in payload"}, 400)
 
     logger.info(f"Received analysis request for IP: {ip}")
 
@@ -92,10 +182,10 @@ def analyze_threat():
     
     logger.info(f"AI Decision for {ip}: {decision.get('recommended_action', 'unknown')}")
     
-    return jsonify({
+    return json_response({
         "status": "success",
         "decision": decision
-    }), 200
+    }, 200)
 
 @app.route('/evaluate_command', methods=['POST'])
 def evaluate_command():
@@ -103,9 +193,9 @@ def evaluate_command():
     Receives an attacker command context and returns an instantaneous 
     ALLOW/BLOCK decision and dynamic decoy payload.
     """
-    data = request.json
+    data = read_request_json(request)
     if not data:
-        return jsonify({"error": "No JSON payload provided"}), 400
+        return json_response({"error": "No JSON payload provided"}, 400)
 
     ip = data.get("ip")
     command = data.get("command")
@@ -113,7 +203,7 @@ def evaluate_command():
     filesystem_context = data.get("filesystem_context", {})
 
     if not ip or not command:
-        return jsonify({"action": "ALLOW", "reason": "Missing ip or command parameters - Fail Open"}), 400
+        return json_response({"action": "ALLOW", "reason": "Missing ip or command parameters - Fail Open"}, 400)
 
     logger.info(f"Received evaluation request for IP: {ip} | Command: {command}")
 
@@ -121,10 +211,24 @@ def evaluate_command():
     
     logger.info(f"AI Decision for {ip}: {decision.get('action')} - Decoy: {decision.get('dynamic_decoy', {}).get('should_deploy')}")
     
-    return jsonify(decision), 200
+    return json_response(decision, 200)
+
+def serve(host='0.0.0.0', port=6001, threads=BRAIN_THREADS):
+    """
+    Serves the app under waitress (multi-threaded, works on Windows) when
+    installed, otherwise falls back to Flask's threaded development server.
+    """
+    telemetry_sampler.ensure_started()
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        logger.warning("waitress not installed (pip install waitress); falling back to the Flask development server.")
+        app.run(host=host, port=port, threaded=True)
+        return
+    waitress_serve(app, host=host, port=port, threads=threads)
 
 if __name__ == '__main__':
     # Start the Brain Server on port 6001
     # Listening on 0.0.0.0 so the Raspberry Pi can connect over LAN
     logger.info("Starting AI Brain Server on port 6001...")
-    app.run(host='0.0.0.0', port=6001)
+    serve()
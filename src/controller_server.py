@@ -1,63 +1,271 @@
-from flask import Flask, request, jsonify
-import json
+from flask import Flask, Response, request, jsonify
+import atexit
+import concurrent.futures
 import os
 import logging
-from datetime import datetime
+import queue
 import requests
 import threading
+import time
+from collections import OrderedDict, deque
 
 from flask_cors import CORS
 
+from geo import geo_lookup
+from json_utils import FastJSONProvider, append_records, loads, migrate_array_to_jsonl
+
 # Configure Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app) # Allow dashboard to fetch directly across the local network
 
 # Configuration
 LOGS_DIR = os.environ.get('LOGS_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs'))
 if not os.path.exists(LOGS_DIR):
     os.makedirs(LOGS_DIR, exist_ok=True)
-CENTRAL_LOG_FILE = os.path.join(LOGS_DIR, 'central_logs.json')
-EXPERIMENT_METRICS_FILE = os.path.join(LOGS_DIR, 'experiment_metrics.json')
+# Both feeds are newline-delimited JSON (one event per line) so each event is a
+# constant-time append instead of a read-parse-rewrite of the whole history.
+CENTRAL_LOG_FILE = os.path.join(LOGS_DIR, 'central_logs.jsonl')
+EXPERIMENT_METRICS_FILE = os.path.join(LOGS_DIR, 'experiment_metrics.jsonl')
 
 # Require API_KEY in environment to prevent insecure defaults in production
 API_KEY = os.environ.get('API_KEY')
 if not API_KEY:
     logger.warning("API_KEY environment variable is missing! Ensure it is set before deployment.")
 
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S" # Dashboard feed timestamps (local time)
+_TS_CACHE = (0, "") # (epoch second, formatted); swapped as one tuple so readers never see a torn pair
+
+def now_ts():
+    """
+    Returns the current feed timestamp, formatting at most once per wall-clock second.
+    """
+    global _TS_CACHE
+    second = int(time.time())
+    cached_second, formatted = _TS_CACHE
+    if second != cached_second:
+        formatted = time.strftime(TIMESTAMP_FORMAT, time.localtime(second))
+        _TS_CACHE = (second, formatted)
+    return formatted
+
+CONTROLLER_THREADS = int(os.environ.get('CONTROLLER_THREADS', '32')) # Concurrent requests (brain proxy calls are I/O-bound)
+
 BRAIN_URL = os.environ.get('BRAIN_URL', 'http://127.0.0.1:6001/analyze')
+BRAIN_EVAL_URL = BRAIN_URL.replace("/analyze", "/evaluate_command")
+
+# Shared keep-alive session: every honeypot command is proxied to the brain, so
+# reusing pooled connections avoids a TCP handshake per evaluation. No retries,
+# a slow brain must fail open quickly rather than be hit twice. The pool holds one
+# connection per server thread so no thread opens (and then discards) an extra one.
+BRAIN_SESSION = requests.Session()
+_brain_adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=CONTROLLER_THREADS, max_retries=0)
+BRAIN_SESSION.mount('http://', _brain_adapter)
+BRAIN_SESSION.mount('https://', _brain_adapter)
+# Fans /evaluate_commands batches out to the brain, one pooled connection per item
+EVAL_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=CONTROLLER_THREADS)
 
 # Global State
 BLOCKED_IPS = set()
+BLOCK_LOCK = threading.Lock() # Guards BLOCKED_IPS across Flask worker threads
+BLOCKLIST_VERSION = 0 # Bumped on every change; served as the /blocklist ETag
+# Versions restart at 0 with the process, so tags carry a per-boot nonce: a honeypot
+# holding a tag from before a restart never matches the new history by accident.
+BLOCKLIST_EPOCH = os.urandom(4).hex()
+# Recent changes as (version, ip, blocked), so honeypots can fetch just the delta
+# since the version they hold; older versions get the full list instead.
+BLOCKLIST_JOURNAL_SIZE = 1024
+BLOCKLIST_CHANGES = deque(maxlen=BLOCKLIST_JOURNAL_SIZE)
+
+def block_ip(ip):
+    global BLOCKLIST_VERSION
+    with BLOCK_LOCK:
+        if ip not in BLOCKED_IPS:
+            BLOCKED_IPS.add(ip)
+            BLOCKLIST_VERSION += 1
+            BLOCKLIST_CHANGES.append((BLOCKLIST_VERSION, ip, True))
+
+def unblock(ip):
+    """
+    Removes ip from the global blocklist. Returns True if it was blocked.
+    """
+    global BLOCKLIST_VERSION
+    with BLOCK_LOCK:
+        if ip not in BLOCKED_IPS:
+            return False
+        BLOCKED_IPS.discard(ip)
+        BLOCKLIST_VERSION += 1
+        BLOCKLIST_CHANGES.append((BLOCKLIST_VERSION, ip, False))
+    return True
+
+def blocklist_tag():
+    """
+    The /blocklist ETag, "<epoch>.<version>". Must be called with BLOCK_LOCK held.
+    """
+    return f"{BLOCKLIST_EPOCH}.{BLOCKLIST_VERSION}"
+
+def blocklist_delta(since):
+    """
+    Changes after the "<epoch>.<version>" tag since as {"epoch", "version",
+    "added", "removed"}, or {"epoch", "version", "full"} if since is from
+    another controller boot, unknown, or older than the journal.
+    Must be called with BLOCK_LOCK held.
+    """
+    epoch, _, version = since.partition('.')
+    since = int(version) if epoch == BLOCKLIST_EPOCH and version.isdigit() else -1
+    if not 0 <= since <= BLOCKLIST_VERSION or since < BLOCKLIST_VERSION - len(BLOCKLIST_CHANGES):
+        return {"epoch": BLOCKLIST_EPOCH, "version": BLOCKLIST_VERSION, "full": list(BLOCKED_IPS)}
+    # Net effect per IP: the last change wins
+    changes = {}
+    for version, ip, blocked in reversed(BLOCKLIST_CHANGES):
+        if version <= since:
+            break
+        changes.setdefault(ip, blocked)
+    return {
+        "epoch": BLOCKLIST_EPOCH,
+        "version": BLOCKLIST_VERSION,
+        "added": [ip for ip, blocked in changes.items() if blocked],
+        "removed": [ip for ip, blocked in changes.items() if not blocked]
+    }
+
+# Feed appends are queued as (path, entry) and written in bursts by FeedWriter
+FEED_QUEUE = queue.Queue()
+FEED_BATCH_SIZE = 64
+FEED_FLUSH_INTERVAL = 0.1 # Max time an entry waits for others to share its write
+
+# Brain decisions keyed by (ip, len(history)) -> (action, expires_at); a history that
+# has not grown since the last query would get the same verdict, so it is not re-sent.
+BRAIN_DECISION_TTL = 60
+BRAIN_DECISION_CACHE_SIZE = 1024
+_BRAIN_DECISIONS = {}
+_BRAIN_DECISIONS_LOCK = threading.Lock()
+
+def _cached_decision(key):
+    with _BRAIN_DECISIONS_LOCK:
+        entry = _BRAIN_DECISIONS.get(key)
+        if entry and entry[1] > time.time():
+            return entry[0]
+        _BRAIN_DECISIONS.pop(key, None)
+        return None
+
+def _store_decision(key, action):
+    with _BRAIN_DECISIONS_LOCK:
+        if len(_BRAIN_DECISIONS) >= BRAIN_DECISION_CACHE_SIZE:
+            # Dicts keep insertion order, so the first key is the oldest entry
+            del _BRAIN_DECISIONS[next(iter(_BRAIN_DECISIONS))]
+        _BRAIN_DECISIONS[key] = (action, time.time() + BRAIN_DECISION_TTL)
+
+class FeedWriter(threading.Thread):
+    """
+    Single writer for the JSONL feeds: drains FEED_QUEUE and appends each burst
+    of up to FEED_BATCH_SIZE entries with one write per file, so request
+    threads never touch the disk.
+    """
+    def __init__(self):
+        super().__init__()
+        self.daemon = True
+        self.running = True
+
+    def run(self):
+        while self.running or not FEED_QUEUE.empty():
+            try:
+                batch = [FEED_QUEUE.get(timeout=1.0)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + FEED_FLUSH_INTERVAL
+            while len(batch) < FEED_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(FEED_QUEUE.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                logger.error(f"FeedWriter error: {e}")
+            finally:
+                for _ in batch:
+                    FEED_QUEUE.task_done()
+
+    def _write_batch(self, batch):
+        by_path = {}
+        for path, entry in batch:
+            by_path.setdefault(path, []).append(entry)
+        for path, entries in by_path.items():
+            append_records(entries, path)
+
+    def flush(self):
+        """
+        Blocks until every queued entry has been written.
+        """
+        FEED_QUEUE.join()
+
+def append_event(entry, path):
+    FEED_QUEUE.put((path, entry))
+
+migrate_array_to_jsonl(os.path.join(LOGS_DIR, 'central_logs.json'), CENTRAL_LOG_FILE)
+migrate_array_to_jsonl(os.path.join(LOGS_DIR, 'experiment_metrics.json'), EXPERIMENT_METRICS_FILE)
+
+# Initialize Feed Writer
+feed_writer = FeedWriter()
+feed_writer.start()
+atexit.register(feed_writer.flush)
 
 def query_brain_server(ip, history):
     """
     Sends the attacker history to the Windows Brain Server and executes 
     the AI's recommended action.
     """
+    cache_key = (ip, len(history))
+    action = _cached_decision(cache_key)
+    if action is not None:
+        logger.info(f"Brain Server decision for {ip} (cached): {action}")
+        return
+
     try:
         # We need a basic profile structure that llm_interface expects
-        # In a full implementation, we'd use analyzer.py logic. For now, rapid mock:
+        # In a full implementation, we'd use analyzer.py logic. For now, rapid mock.
+        # Single pass over the history instead of one comprehension per field.
+        total_attempts = 0
+        usernames = set()
+        passwords = set()
+        commands = []
+        for l in history:
+            if l.get('event_type') == 'LOGIN_ATTEMPT':
+                total_attempts += 1
+            username = l.get('username')
+            password = l.get('password')
+            command = l.get('command')
+            if username:
+                usernames.add(username)
+            if password:
+                passwords.add(password)
+            if command:
+                commands.append(command)
+
         profile = {
-            "total_attempts": len([l for l in history if l.get('event_type') == 'LOGIN_ATTEMPT']),
+            "total_attempts": total_attempts,
             "duration": "unknown",
-            "unique_usernames": list(set([l.get('username') for l in history if l.get('username')])),
-            "unique_passwords": list(set([l.get('password') for l in history if l.get('password')])),
-            "patterns": [l.get('command') for l in history if l.get('command')],
+            "unique_usernames": list(usernames),
+            "unique_passwords": list(passwords),
+            "patterns": commands,
             "risk_score": 50 # Baseline
         }
         
         payload = {"ip": ip, "profile": profile}
         
         logger.info(f"Querying Brain Server for IP {ip}...")
-        response = requests.post(BRAIN_URL, json=payload, timeout=10)
+        response = BRAIN_SESSION.post(BRAIN_URL, json=payload, timeout=10)
         
         if response.status_code == 200:
-            decision = response.json().get('decision', {})
+            decision = loads(response.content).get('decision', {})
             action = decision.get('recommended_action')
             logger.info(f"Brain Server decision for {ip}: {action}")
+            _store_decision(cache_key, action or '')
             
             if action == 'block' or action == 'Block':
                 logger.warning(f"AI RECOMMENDED BLOCK during post-mortem: Logging incident but preventing retroactive ban to allow reconnection.")
@@ -72,52 +280,33 @@ def validate_api_key(request):
     key = request.headers.get('X-API-KEY')
     return key == API_KEY
 
-@app.route('/evaluate_command', methods=['POST'])
-def proxy_evaluate_command():
+def evaluate_one(data):
     """
-    Proxies real-time command evaluation requests from honeypot to brain server.
+    Gets a real-time verdict for one honeypot command from the brain server.
     Instantly updates local blocklist if AI decides to block.
+    Returns (decision, status); failures are fail-open ALLOW decisions.
     """
-    if not validate_api_key(request):
-        return jsonify({"error": "Unauthorized"}), 401
-        
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"action": "ALLOW", "reason": "No JSON - Fail Open"}), 400
+        if not data or not isinstance(data, dict):
+            return {"action": "ALLOW", "reason": "No JSON - Fail Open"}, 400
             
         ip = data.get("ip")
         
-        # Brain URL for evaluation
-        eval_url = BRAIN_URL.replace("/analyze", "/evaluate_command")
-        
         # Proxy request with timeout to the brain (5 sec)
         # We give the controller slightly less time so the honeypot's timeout doesn't fire first
-        response = requests.post(eval_url, json=data, timeout=5.0)
+        response = BRAIN_SESSION.post(BRAIN_EVAL_URL, json=data, timeout=5.0)
         
         if response.status_code == 200:
-            decision = response.json()
+            decision = loads(response.content)
             
             # Instant Enforcement if BLOCK
             if decision.get("action") == "BLOCK" and ip:
                 logger.warning(f"AI RECOMMENDED BLOCK during real-time evaluation: Banning {ip} dynamically!")
-                BLOCKED_IPS.add(ip)
+                block_ip(ip)
                 
             # Update Dashboard JSON Feed instantaneously
             try:
-                # Mock Geolocation (simulate distinct regions based on IP subsets instead of bundling a heavy GeoIP library on the Pi edge node)
-                geo = {"country": "Unknown", "city": "Unknown", "isp": "Unknown"}
-                if ip.startswith("89."): geo = {"country": "Netherlands", "city": "Amsterdam", "isp": "KPN"}
-                elif ip.startswith("185."): geo = {"country": "Russia", "city": "Moscow", "isp": "Rostelecom"}
-                elif ip.startswith("114."): geo = {"country": "China", "city": "Nanjing", "isp": "China Telecom"}
-                elif ip.startswith("177."): geo = {"country": "Brazil", "city": "Sao Paulo", "isp": "Vivo"}
-                elif ip.startswith("54."): geo = {"country": "USA", "city": "Ashburn", "isp": "Amazon AWS"}
-                elif ip.startswith("192.168."): geo = {"country": "Germany", "city": "Frankfurt", "isp": "Local Testnet Node"}
-                elif ip.startswith("80."): geo = {"country": "UK", "city": "London", "isp": "BT"}
-                elif ip.startswith("118."): geo = {"country": "South Korea", "city": "Seoul", "isp": "KT"}
-                elif ip.startswith("104."): geo = {"country": "South Africa", "city": "Cape Town", "isp": "Vodacom"}
-                elif ip.startswith("13."): geo = {"country": "India", "city": "Mumbai", "isp": "Jio"}
-                elif ip.startswith("82."): geo = {"country": "Romania", "city": "Bucharest", "isp": "Orange"}
+                geo = geo_lookup(ip)
                 
                 cmd_str = data.get("command", "unknown").strip()
                 action_str = decision.get("action", "ALLOW")
@@ -130,7 +319,7 @@ def proxy_evaluate_command():
                 
                 if not is_noise:
                     log_entry = {
-                        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                        "timestamp": now_ts(),
                         "attacker_ip": ip,
                         "geolocation": geo,
                         "command": cmd_str,
@@ -141,63 +330,208 @@ def proxy_evaluate_command():
                         "summary": f"Attacker executed: {cmd_str[:30]}..." if len(cmd_str) > 30 else f"Attacker executed: {cmd_str}"
                     }
                     
-                    metrics_data = []
-                    if os.path.exists(EXPERIMENT_METRICS_FILE):
-                        try:
-                            with open(EXPERIMENT_METRICS_FILE, 'r') as f:
-                                content = f.read().strip()
-                                if content:
-                                    metrics_data = json.loads(content)
-                        except Exception:
-                            pass
-                    
-                    metrics_data.append(log_entry)
-                    
-                    with open(EXPERIMENT_METRICS_FILE, 'w') as f:
-                        json.dump(metrics_data, f, indent=4)
+                    append_event(log_entry, EXPERIMENT_METRICS_FILE)
                     
             except Exception as e:
                 logger.error(f"Failed to update experiment_metrics UI feed: {e}")
                 
-            return jsonify(decision), 200
+            return decision, 200
         else:
             logger.error(f"Brain Server returned {response.status_code} during evaluation proxy")
-            return jsonify({"action": "ALLOW", "reason": "Brain Server Error - Fail Open"}), 500
+            return {"action": "ALLOW", "reason": "Brain Server Error - Fail Open"}, 500
             
     except requests.Timeout:
         logger.error("Brain Server timed out during real-time evaluation proxy")
-        return jsonify({"action": "ALLOW", "reason": "Timeout - Fail Open"}), 504
+        return {"action": "ALLOW", "reason": "Timeout - Fail Open"}, 504
     except Exception as e:
         logger.error(f"Error Proxying Evaluation: {e}")
-        return jsonify({"action": "ALLOW", "reason": "Internal Error - Fail Open"}), 500
+        return {"action": "ALLOW", "reason": "Internal Error - Fail Open"}, 500
+
+@app.route('/evaluate_command', methods=['POST'])
+def proxy_evaluate_command():
+    """
+    Proxies real-time command evaluation requests from honeypot to brain server.
+    """
+    if not validate_api_key(request):
+        return jsonify({"error": "Unauthorized"}), 401
+    decision, status = evaluate_one(request.get_json(silent=True))
+    return jsonify(decision), status
+
+@app.route('/evaluate_commands', methods=['POST'])
+def proxy_evaluate_commands():
+    """
+    Bulk form of /evaluate_command for honeypots that micro-batch evaluations:
+    {"batch": [payload, ...]} -> {"results": [{"status": ..., "decision": ...}, ...]}
+    in the same order. Items are sent to the brain concurrently.
+    """
+    if not validate_api_key(request):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    data = request.get_json(silent=True)
+    batch = data.get("batch") if isinstance(data, dict) else None
+    if not isinstance(batch, list):
+        return jsonify({"error": "Expected a JSON object with a 'batch' list"}), 400
+
+    results = [{"status": status, "decision": decision} for decision, status in EVAL_POOL.map(evaluate_one, batch)]
+    return jsonify({"results": results}), 200
 
 @app.route('/blocklist', methods=['GET'])
 def get_blocklist():
-    # Helper to return list of blocked IPs
-    return jsonify(list(BLOCKED_IPS))
+    # Helper to return list of blocked IPs; ?since=<epoch>.<version> returns only the changes
+    since = request.args.get('since')
+    # Snapshot under the lock: iterating while another thread adds raises RuntimeError
+    with BLOCK_LOCK:
+        version = blocklist_tag()
+        if request.if_none_match.contains(version):
+            body = None
+        elif since is None:
+            body = list(BLOCKED_IPS)
+        else:
+            body = blocklist_delta(since)
+    # Honeypots poll with If-None-Match; an unchanged list costs an empty 304
+    response = Response(status=304) if body is None else jsonify(body)
+    response.set_etag(version)
+    return response
 
 @app.route('/unblock/<ip>', methods=['GET'])
 def unblock_ip(ip):
     # Remove IP from Global Blocklist idempotently
-    if ip in BLOCKED_IPS:
-        BLOCKED_IPS.remove(ip)
+    if unblock(ip):
         logger.info(f"Global Blocklist updated: Removed {ip}")
     return jsonify({"status": "success", "message": f"{ip} is unblocked"}), 200
 
+STREAM_CHUNK_SIZE = 64 * 1024
+
+def stream_json_array(f, size):
+    """
+    Frames the first size bytes of an open JSONL file as a JSON array without
+    decoding the lines. Stopping at size keeps the body consistent with the
+    ETag computed from the same stat, even while the writer keeps appending.
+    Lines are yielded in chunks of about STREAM_CHUNK_SIZE bytes.
+    """
+    with f:
+        parts = [b'[']
+        buffered = 0
+        first = True
+        remaining = size
+        for line in f:
+            remaining -= len(line)
+            line = line.strip()
+            if line:
+                if not first:
+                    parts.append(b',')
+                parts.append(line)
+                first = False
+                buffered += len(line) + 1
+                if buffered >= STREAM_CHUNK_SIZE:
+                    yield b''.join(parts)
+                    parts = []
+                    buffered = 0
+            if remaining <= 0:
+                break
+        parts.append(b']')
+        yield b''.join(parts)
+
 @app.route('/api/metrics', methods=['GET'])
 def serve_metrics():
-    """Serves the intelligence feed directly to the Windows dashboard UI."""
+    """
+    Serves the intelligence feed directly to the Windows dashboard UI.
+    The ETag is the feed's mtime and size, so dashboard polls with a matching
+    If-None-Match get an empty 304 instead of the whole feed.
+    """
     try:
-        if os.path.exists(EXPERIMENT_METRICS_FILE):
-            with open(EXPERIMENT_METRICS_FILE, 'r') as f:
-                content = f.read().strip()
-                if content:
-                    return jsonify(json.loads(content)), 200
-        return jsonify([]), 200
+        try:
+            f = open(EXPERIMENT_METRICS_FILE, 'rb')
+        except FileNotFoundError:
+            return jsonify([]), 200
+        st = os.fstat(f.fileno())
+        etag = f"{st.st_mtime_ns:x}-{st.st_size:x}"
+        if request.if_none_match.contains(etag):
+            f.close()
+            response = Response(status=304)
+        else:
+            response = Response(stream_json_array(f, st.st_size), mimetype='application/json')
+        response.set_etag(etag)
+        response.last_modified = st.st_mtime
+        response.cache_control.no_cache = True # Always revalidate; the feed changes constantly
+        return response
     except Exception as e:
         logger.error(f"Error serving metrics JSON: {e}")
         return jsonify({"error": "Failed to read internal AI logs"}), 500
 
+REQUIRED_LOG_FIELDS = ('timestamp', 'event_type', 'sensor_id')
+
+# Most recently received (event_type, ip) pairs -> their last timestamp, so
+# /events can answer "has this been seen" without reading the central log
+RECENT_EVENTS_SIZE = 4096
+RECENT_EVENTS = OrderedDict()
+RECENT_EVENTS_LOCK = threading.Lock()
+
+def record_recent_event(data):
+    """
+    Marks (event_type, ip) as seen, evicting the least recently seen pair when full.
+    """
+    key = (data.get('event_type'), data.get('ip'))
+    with RECENT_EVENTS_LOCK:
+        RECENT_EVENTS[key] = data.get('timestamp')
+        RECENT_EVENTS.move_to_end(key)
+        if len(RECENT_EVENTS) > RECENT_EVENTS_SIZE:
+            RECENT_EVENTS.popitem(last=False)
+
+def missing_log_field(data):
+    """
+    Returns the first required field missing from a log event, or None.
+    """
+    for field in REQUIRED_LOG_FIELDS:
+        if field not in data:
+            return field
+    return None
+
+def process_log_event(data):
+    """
+    Aggregates one validated honeypot event: central log, blocklist and intelligence feed.
+    """
+    append_event(data, CENTRAL_LOG_FILE)
+    record_recent_event(data)
+
+    logger.info(f"Received log from {data.get('sensor_id')}: {data.get('event_type')}")
+    
+    # Stage 6: Orchestration - Update Blocklist
+    if data.get('event_type') == 'BLOCK':
+        ip = data.get('ip')
+        if ip:
+            block_ip(ip)
+            logger.info(f"Global Blocklist updated: Added {ip}")
+    
+    # Stage 7: AI Feedback Loop & Intelligence Feed Trigger
+    if data.get('event_type') == 'SHELL_SESSION_END':
+        ip = data.get('ip')
+        details = data.get('details', 'Session ended')
+        if ip:
+            # Append Dwell Time to Dashboard Intelligence Feed
+            try:
+                geo = geo_lookup(ip)
+
+                log_entry = {
+                    "timestamp": now_ts(),
+                    "attacker_ip": ip,
+                    "geolocation": geo,
+                    "command": "CONNECTION TERMINATED",
+                    "ai_decision": "DISCONNECT",
+                    "ai_justification": details,
+                    "risk_score": 0,
+                    "latency": 0.0,
+                    "summary": f"Attacker disconnected. {details}"
+                }
+
+                append_event(log_entry, EXPERIMENT_METRICS_FILE)
+            except Exception as e:
+                logger.error(f"Failed to update metrics for SESSION_END: {e}")
+
+            # Gather history for this IP from central log
+            # history = [l for l in iter_records(CENTRAL_LOG_FILE) if l.get('ip') == ip]
+            # threading.Thread(target=query_brain_server, args=(ip, history), daemon=True).start()
+
 @app.route('/receive_log', methods=['POST'])
 def receive_log():
     # Optional Security Check
@@ -210,80 +544,13 @@ def receive_log():
              return jsonify({"error": "Invalid JSON"}), 400
         
         # Basic Validation
-        required_fields = ['timestamp', 'event_type', 'sensor_id']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({"error": f"Missing field: {field}"}), 400
+        field = missing_log_field(data)
+        if field:
+            return jsonify({"error": f"Missing field: {field}"}), 400
 
         # Log Aggregation
         try:
-            logs = []
-            if os.path.exists(CENTRAL_LOG_FILE):
-                with open(CENTRAL_LOG_FILE, 'r') as f:
-                    logs = json.load(f)
-            
-            logs.append(data)
-            
-            with open(CENTRAL_LOG_FILE, 'w') as f:
-                json.dump(logs, f, indent=4) # In prod, append to file stream or DB
-                
-            logger.info(f"Received log from {data.get('sensor_id')}: {data.get('event_type')}")
-            
-            # Stage 6: Orchestration - Update Blocklist
-            if data.get('event_type') == 'BLOCK':
-                ip = data.get('ip')
-                if ip:
-                    BLOCKED_IPS.add(ip)
-                    logger.info(f"Global Blocklist updated: Added {ip}")
-            
-            # Stage 7: AI Feedback Loop & Intelligence Feed Trigger
-            if data.get('event_type') == 'SHELL_SESSION_END':
-                ip = data.get('ip')
-                details = data.get('details', 'Session ended')
-                if ip:
-                    # Append Dwell Time to Dashboard Intelligence Feed
-                    try:
-                        geo = {"country": "Unknown", "city": "Unknown", "isp": "Unknown"}
-                        if ip.startswith("89."): geo = {"country": "Netherlands", "city": "Amsterdam", "isp": "KPN"}
-                        elif ip.startswith("185."): geo = {"country": "Russia", "city": "Moscow", "isp": "Rostelecom"}
-                        elif ip.startswith("114."): geo = {"country": "China", "city": "Nanjing", "isp": "China Telecom"}
-                        elif ip.startswith("177."): geo = {"country": "Brazil", "city": "Sao Paulo", "isp": "Vivo"}
-                        elif ip.startswith("54."): geo = {"country": "USA", "city": "Ashburn", "isp": "Amazon AWS"}
-                        elif ip.startswith("192.168."): geo = {"country": "Germany", "city": "Frankfurt", "isp": "Local Testnet Node"}
-                        elif ip.startswith("80."): geo = {"country": "UK", "city": "London", "isp": "BT"}
-                        elif ip.startswith("118."): geo = {"country": "South Korea", "city": "Seoul", "isp": "KT"}
-                        elif ip.startswith("104."): geo = {"country": "South Africa", "city": "Cape Town", "isp": "Vodacom"}
-                        elif ip.startswith("13."): geo = {"country": "India", "city": "Mumbai", "isp": "Jio"}
-                        elif ip.startswith("82."): geo = {"country": "Romania", "city": "Bucharest", "isp": "Orange"}
-
-                        log_entry = {
-                            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                            "attacker_ip": ip,
-                            "geolocation": geo,
-                            "command": "CONNECTION TERMINATED",
-                            "ai_decision": "DISCONNECT",
-                            "ai_justification": details,
-                            "risk_score": 0,
-                            "latency": 0.0,
-                            "summary": f"Attacker disconnected. {details}"
-                        }
-
-                        metrics_data = []
-                        if os.path.exists(EXPERIMENT_METRICS_FILE):
-                            with open(EXPERIMENT_METRICS_FILE, 'r') as f:
-                                content = f.read().strip()
-                                if content:
-                                    metrics_data = json.loads(content)
-                        metrics_data.append(log_entry)
-                        with open(EXPERIMENT_METRICS_FILE, 'w') as f:
-                            json.dump(metrics_data, f, indent=4)
-                    except Exception as e:
-                        logger.error(f"Failed to update metrics for SESSION_END: {e}")
-
-                    # Gather history for this IP from central log
-                    # history = [l for l in logs if l.get('ip') == ip]
-                    # threading.Thread(target=query_brain_server, args=(ip, history), daemon=True).start()
-
+            process_log_event(data)
             return jsonify({"status": "success"}), 200
 
         except Exception as e:
@@ -294,6 +561,63 @@ def receive_log():
         logger.error(f"Error processing request: {e}")
         return jsonify({"error": "Bad Request"}), 400
 
+@app.route('/events', methods=['GET'])
+def get_events():
+    # ?event_type=BLOCK&ip=1.2.3.4 -> whether that pair is among the recent events
+    if not validate_api_key(request):
+        return jsonify({"error": "Unauthorized"}), 401
+    key = (request.args.get('event_type'), request.args.get('ip'))
+    with RECENT_EVENTS_LOCK:
+        found = key in RECENT_EVENTS
+        timestamp = RECENT_EVENTS.get(key)
+    return jsonify({"found": found, "last_seen": timestamp})
+
+@app.route('/receive_logs', methods=['POST'])
+def receive_logs():
+    """
+    Batch variant of /receive_log: accepts {"events": [...]} so sensors can
+    forward a burst of events in one request. Invalid events are counted
+    and skipped rather than failing the whole batch.
+    """
+    if not validate_api_key(request):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    try:
+        data = request.get_json()
+        events = data.get('events') if isinstance(data, dict) else None
+        if not isinstance(events, list):
+            return jsonify({"error": "Invalid JSON"}), 400
+    except Exception as e:
+        logger.error(f"Error processing request: {e}")
+        return jsonify({"error": "Bad Request"}), 400
+
+    accepted = 0
+    try:
+        for event in events:
+            if isinstance(event, dict) and not missing_log_field(event):
+                process_log_event(event)
+                accepted += 1
+    except Exception as e:
+        logger.error(f"Failed to write central log: {e}")
+        return jsonify({"error": "Internal Server Error"}), 500
+
+    return jsonify({"status": "success", "accepted": accepted, "rejected": len(events) - accepted}), 200
+
+def serve(host='0.0.0.0', port=5000, threads=CONTROLLER_THREADS):
+    """
+    Serves the app under waitress when installed, otherwise falls back to
+    Flask's threaded development server. Both run a single process: the
+    blocklist and feed writer are in-process state, so forking workers
+    would split them.
+    """
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        logger.warning("waitress not installed (pip install waitress); falling back to the Flask development server.")
+        app.run(host=host, port=port, threaded=True)
+        return
+    waitress_serve(app, host=host, port=port, threads=threads)
+
 if __name__ == '__main__':
     # Run on all interfaces for Docker compatibility
-    app.run(host='0.0.0.0', port=5000)
+    serve()
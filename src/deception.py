@@ -1,29 +1,68 @@
-import json
 import logging
 import time
 import os
+import posixpath
 import random
+import re
 import string
+import threading
 from datetime import datetime
+from functools import lru_cache
+
+from json_utils import load_file
 
 logger = logging.getLogger(__name__)
 
+# Matches {{KEY}} placeholders in decoy templates
+PLACEHOLDER_RE = re.compile(r'\{\{(\w+)\}\}')
+
+DECOY_TEMPLATES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "decoy_templates.json")
+_TEMPLATE_CACHE = None
+_TEMPLATE_LOCK = threading.Lock()
+
+def _get_templates():
+    """
+    Parses decoy_templates.json on first use and returns the cached template list.
+    Every connection builds its own FakeFilesystem, so the file is read once per
+    process instead of once per session. Returns None if the file is missing.
+    """
+    global _TEMPLATE_CACHE
+    if _TEMPLATE_CACHE is None:
+        with _TEMPLATE_LOCK:
+            if _TEMPLATE_CACHE is None:
+                if not os.path.exists(DECOY_TEMPLATES_PATH):
+                    return None
+                _TEMPLATE_CACHE = load_file(DECOY_TEMPLATES_PATH).get("templates", [])
+    return _TEMPLATE_CACHE
+
+@lru_cache(maxsize=2048)
+def _resolve(current_path, new_path):
+    # posixpath.normpath collapses '.', '..' and repeated slashes; an absolute
+    # new_path makes join discard current_path
+    target = posixpath.normpath(posixpath.join(current_path, new_path))
+    # POSIX keeps exactly two leading slashes, the fake shell does not
+    if target.startswith('//'):
+        target = '/' + target.lstrip('/')
+    return target
+
 class FakeFilesystem:
     """
     Represents a virtual directory structure for the honeypot.
     """
     def __init__(self):
+        # Directory contents are insertion-ordered sets (dict keys): O(1) membership
+        # checks when deploying decoys, while listings keep their original order.
         self.fs = {
-            '/': {'type': 'dir', 'contents': ['bin', 'etc', 'home', 'var', 'usr', 'tmp', 'root']},
-            '/bin': {'type': 'dir', 'contents': ['ls', 'cd', 'pwd', 'cat', 'echo', 'bash', 'sh']},
-            '/etc': {'type': 'dir', 'contents': ['passwd', 'shadow', 'hostname', 'hosts']},
-            '/home': {'type': 'dir', 'contents': ['user']},
-            '/home/user': {'type': 'dir', 'contents': []},
-            '/var': {'type': 'dir', 'contents': ['log', 'www']},
-            '/var/log': {'type': 'dir', 'contents': ['auth.log', 'syslog']},
-            '/root': {'type': 'dir', 'contents': []},
-            '/tmp': {'type': 'dir', 'contents': []},
-            '/usr': {'type': 'dir', 'contents': ['bin', 'lib']},
+            '/': {'type': 'dir', 'contents': dict.fromkeys(['bin', 'etc', 'home', 'var', 'usr', 'tmp', 'root'])},
+            '/bin': {'type': 'dir', 'contents': dict.fromkeys(['ls', 'cd', 'pwd', 'cat', 'echo', 'bash', 'sh'])},
+            '/etc': {'type': 'dir', 'contents': dict.fromkeys(['passwd', 'shadow', 'hostname', 'hosts'])},
+            '/home': {'type': 'dir', 'contents': dict.fromkeys(['user'])},
+            '/home/user': {'type': 'dir', 'contents': {}},
+            '/var': {'type': 'dir', 'contents': dict.fromkeys(['log', 'www'])},
+            '/var/log': {'type': 'dir', 'contents': dict.fromkeys(['auth.log', 'syslog'])},
+            '/root': {'type': 'dir', 'contents': {}},
+            '/tmp': {'type': 'dir', 'contents': {}},
+            '/usr': {'type': 'dir', 'contents': dict.fromkeys(['bin', 'lib'])},
         }
         
         # File contents
@@ -37,24 +76,17 @@ class FakeFilesystem:
         self._load_decoy_blueprints()
 
     def _generate_random_string(self, length=16, use_chars=string.ascii_letters + string.digits):
-        return ''.join(random.choice(use_chars) for _ in range(length))
+        return ''.join(random.choices(use_chars, k=length))
 
     def _load_decoy_blueprints(self):
         """
         Loads decoy templates from JSON and populates the filesystem with highly realistic content.
         """
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        decoy_path = os.path.join(script_dir, "decoy_templates.json")
-        
-        if not os.path.exists(decoy_path):
-            logger.warning(f"Decoy template file missing at {decoy_path}. Skipping dynamic population.")
-            return
-
         try:
-            with open(decoy_path, 'r') as f:
-                data = json.load(f)
-                
-            templates = data.get("templates", [])
+            templates = _get_templates()
+            if templates is None:
+                logger.warning(f"Decoy template file missing at {DECOY_TEMPLATES_PATH}. Skipping dynamic population.")
+                return
             
             # Persistent generated data for this honeypot session to ensure cross-file consistency
             session_data = {
@@ -83,14 +115,16 @@ class FakeFilesystem:
                 "ORG_NAME": "SecureCorpInc"
             }
 
+            # Unknown placeholders are left untouched
+            def resolve(match):
+                return session_data.get(match.group(1), match.group(0))
+
             for tpl in templates:
                 path = tpl.get("default_path")
                 raw_content = tpl.get("content_template", "")
                 
-                # Dynamically resolve placeholders
-                resolved_content = raw_content
-                for key, val in session_data.items():
-                    resolved_content = resolved_content.replace(f"{{{{{key}}}}}", val)
+                # Dynamically resolve placeholders in one pass over the template
+                resolved_content = PLACEHOLDER_RE.sub(resolve, raw_content)
                     
                 # Inject the generated decoy file directly into the filesystem
                 self.deploy_decoy(path, resolved_content)
@@ -104,27 +138,7 @@ class FakeFilesystem:
         """
         Resolves a path relative to current_path.
         """
-        if new_path.startswith('/'):
-            target = new_path
-        else:
-            if current_path == '/':
-                target = '/' + new_path
-            else:
-                target = current_path + '/' + new_path
-        
-        # Normalize path (handle .. and .)
-        parts = target.split('/')
-        normalized = []
-        for part in parts:
-            if part == '' or part == '.':
-                continue
-            if part == '..':
-                if normalized:
-                    normalized.pop()
-            else:
-                normalized.append(part)
-        
-        return '/' + '/'.join(normalized)
+        return _resolve(current_path, new_path)
 
     def list_dir(self, path):
         """
@@ -138,7 +152,20 @@ class FakeFilesystem:
         if node['type'] != 'dir':
             return None # Not a directory
             
-        return node['contents']
+        return list(node['contents'])
+
+    def list_dir_str(self, path):
+        """
+        Returns the ls-formatted listing of a directory, or None if it isn't one.
+        The joined string is memoized on the node until deploy_decoy changes it.
+        """
+        node = self.fs.get(path)
+        if node is None or node['type'] != 'dir':
+            return None
+        display = node.get('display')
+        if display is None:
+            display = node['display'] = "  ".join(node['contents'])
+        return display
 
     def get_file_content(self, path):
         """
@@ -163,27 +190,29 @@ class FakeFilesystem:
         
         parts = path.strip('/').split('/')
         filename = parts[-1]
-        
-        # Build path recursively
-        current_dir = '/'
-        for part in parts[:-1]:
-            if not part: continue
-            
-            next_dir = f"{current_dir}{part}" if current_dir == '/' else f"{current_dir}/{part}"
-            
-            # Create if it doesn't exist
-            if next_dir not in self.fs:
-                self.fs[next_dir] = {'type': 'dir', 'contents': []}
-                # Add it to parent's contents
-                if part not in self.fs[current_dir]['contents']:
-                    self.fs[current_dir]['contents'].append(part)
-            
-            current_dir = next_dir
-            
-        # Add the final file to the parent directory
-        if current_dir in self.fs:
-            if filename not in self.fs[current_dir]['contents']:
-                self.fs[current_dir]['contents'].append(filename)
+        parent_dir = '/' + '/'.join(part for part in parts[:-1] if part)
+
+        # Decoys usually land in directories that already exist, so this is
+        # normally a single lookup; only missing ancestors are walked
+        self._ensure_dir(parent_dir)
+        self._add_entry(parent_dir, filename)
+
+    def _ensure_dir(self, dir_path):
+        """
+        Creates dir_path and any missing ancestors, linking each into its parent.
+        """
+        if dir_path in self.fs:
+            return
+        parent_dir, name = posixpath.split(dir_path)
+        self._ensure_dir(parent_dir)
+        self.fs[dir_path] = {'type': 'dir', 'contents': {}}
+        self._add_entry(parent_dir, name)
+
+    def _add_entry(self, dir_path, name):
+        node = self.fs[dir_path]
+        if name not in node['contents']:
+            node['contents'][name] = None
+            node['display'] = None # Invalidate the cached ls listing
 
 
 class CommandSimulator:
@@ -195,6 +224,18 @@ class CommandSimulator:
         self.current_path = '/root'
         self.hostname = 'server01'
         self.user = 'root'
+        # Command name -> handler(args); unknown commands fall through to "command not found".
+        # Download tools (wget, curl, apt, apt-get, yum) deliberately fall through too.
+        self._dispatch = {
+            'ls': self._cmd_ls,
+            'cd': self._cmd_cd,
+            'pwd': lambda args: self.current_path,
+            'cat': self._cmd_cat,
+            'whoami': lambda args: self.user,
+            'id': lambda args: f"uid=0({self.user}) gid=0({self.user}) groups=0({self.user})",
+            'uname': self._cmd_uname,
+            'exit': lambda args: "EXIT",
+        }
 
     def execute_command(self, cmd_line):
         """
@@ -206,30 +247,15 @@ class CommandSimulator:
             return ""
         
         cmd = parts[0]
-        args = parts[1:]
-        
-        if cmd == 'ls':
-            return self._cmd_ls(args)
-        elif cmd == 'cd':
-            return self._cmd_cd(args)
-        elif cmd == 'pwd':
-            return self.current_path
-        elif cmd == 'cat':
-            return self._cmd_cat(args)
-        elif cmd == 'whoami':
-            return self.user
-        elif cmd == 'id':
-            return f"uid=0({self.user}) gid=0({self.user}) groups=0({self.user})"
-        elif cmd == 'uname':
-            if '-a' in args:
-                return "Linux server01 5.4.0-42-generic #46-Ubuntu SMP Fri Jul 10 00:24:02 UTC 2020 x86_64 x86_64 x86_64 GNU/Linux"
-            return "Linux"
-        elif cmd == 'exit':
-            return "EXIT"
-        elif cmd in ['wget', 'curl', 'apt', 'apt-get', 'yum']:
-             return f"{cmd}: command not found" # Or fake a download
-        else:
+        handler = self._dispatch.get(cmd)
+        if handler is None:
             return f"{cmd}: command not found"
+        return handler(parts[1:])
+
+    def _cmd_uname(self, args):
+        if '-a' in args:
+            return "Linux server01 5.4.0-42-generic #46-Ubuntu SMP Fri Jul 10 00:24:02 UTC 2020 x86_64 x86_64 x86_64 GNU/Linux"
+        return "Linux"
 
     def _cmd_ls(self, args):
         target = self.current_path
@@ -240,13 +266,13 @@ class CommandSimulator:
         if paths:
             target = self.fs.resolve_path(self.current_path, paths[0])
             
-        contents = self.fs.list_dir(target)
-        if contents is None:
+        listing = self.fs.list_dir_str(target)
+        if listing is None:
             if self.fs.is_file(target):
                 return paths[0] if paths else target
             return f"ls: cannot access '{paths[0] if paths else target}': No such file or directory"
             
-        return "  ".join(contents)
+        return listing
 
     def _cmd_cd(self, args):
         if not args:
@@ -0,0 +1,32 @@
+from functools import lru_cache
+
+# Mock Geolocation (simulate distinct regions based on IP subsets instead of bundling a heavy GeoIP library on the Pi edge node)
+# Keyed by leading octets; geo_lookup tries the two-octet prefix before the one-octet one.
+DEFAULT_GEO = {"country": "Unknown", "city": "Unknown", "isp": "Unknown"}
+GEO_TABLE = {
+    "89": {"country": "Netherlands", "city": "Amsterdam", "isp": "KPN"},
+    "185": {"country": "Russia", "city": "Moscow", "isp": "Rostelecom"},
+    "114": {"country": "China", "city": "Nanjing", "isp": "China Telecom"},
+    "177": {"country": "Brazil", "city": "Sao Paulo", "isp": "Vivo"},
+    "54": {"country": "USA", "city": "Ashburn", "isp": "Amazon AWS"},
+    "192.168": {"country": "Germany", "city": "Frankfurt", "isp": "Local Testnet Node"},
+    "80": {"country": "UK", "city": "London", "isp": "BT"},
+    "118": {"country": "South Korea", "city": "Seoul", "isp": "KT"},
+    "104": {"country": "South Africa", "city": "Cape Town", "isp": "Vodacom"},
+    "13": {"country": "India", "city": "Mumbai", "isp": "Jio"},
+    "82": {"country": "Romania", "city": "Bucharest", "isp": "Orange"},
+}
+
+@lru_cache(maxsize=4096)
+def geo_lookup(ip):
+    """
+    Longest-prefix match of an IPv4 address against GEO_TABLE in at most two dict lookups.
+    """
+    if not ip:
+        return DEFAULT_GEO
+    octets = ip.split('.', 2)
+    if len(octets) > 1:
+        geo = GEO_TABLE.get(f"{octets[0]}.{octets[1]}")
+        if geo:
+            return geo
+    return GEO_TABLE.get(octets[0], DEFAULT_GEO)
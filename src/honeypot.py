@@ -1,6 +1,5 @@
 import socket
 import threading
-import json
 import time
 import logging
 import paramiko
@@ -8,12 +7,19 @@ import os
 import signal
 import sys
 import queue
+import concurrent.futures
 import requests
+import hashlib
+import select
+import weakref
+from cryptography.hazmat.primitives import serialization
+from collections import OrderedDict, deque
 from datetime import datetime
 
 # Ensure src/ siblings are importable regardless of CWD
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from deception import CommandSimulator
+from json_utils import append_records, dumps, loads, migrate_array_to_jsonl
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -22,6 +28,38 @@ logger = logging.getLogger(__name__)
 # Configuration
 _PROJECT_ROOT = os.environ.get('PROJECT_ROOT', os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 HOST_KEY_PATH = os.environ.get('HOST_KEY_PATH', os.path.join(_PROJECT_ROOT, 'host.key'))
+# DER copy of the host key; loading it skips the ~50 ms RSA consistency check
+# that parsing the PEM file costs every process start. It starts with the
+# SHA-256 of the PEM file it was made from, so a replaced key is never shadowed.
+HOST_KEY_CACHE_PATH = HOST_KEY_PATH + '.der'
+_PEM_DIGEST_SIZE = 32
+
+def load_host_key():
+    """
+    Loads the RSA host key, preferring the DER cache when it was written from
+    the current PEM file's contents. The PEM key is validated when parsed, and
+    the cache is only ever written from a validated key, so the cache load
+    skips re-validation.
+    """
+    with open(HOST_KEY_PATH, 'rb') as f:
+        pem_digest = hashlib.sha256(f.read()).digest()
+    try:
+        with open(HOST_KEY_CACHE_PATH, 'rb') as f:
+            cached = f.read()
+        if cached[:_PEM_DIGEST_SIZE] == pem_digest:
+            return paramiko.RSAKey(key=serialization.load_der_private_key(cached[_PEM_DIGEST_SIZE:], None, unsafe_skip_rsa_key_validation=True))
+    except (OSError, ValueError, TypeError) as e: # TypeError: cryptography < 39
+        logger.debug(f"Host key cache unavailable: {e}")
+
+    key = paramiko.RSAKey(filename=HOST_KEY_PATH)
+    try:
+        der = key.key.private_bytes(serialization.Encoding.DER, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+        fd = os.open(HOST_KEY_CACHE_PATH, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(pem_digest + der)
+    except OSError as e:
+        logger.warning(f"Could not write host key cache {HOST_KEY_CACHE_PATH}: {e}")
+    return key
 
 # Attempt to load or generate the host key immediately so paramiko doesn't crash on load
 if not os.path.exists(HOST_KEY_PATH):
@@ -29,15 +67,43 @@ if not os.path.exists(HOST_KEY_PATH):
     key = paramiko.RSAKey.generate(2048)
     key.write_private_key_file(HOST_KEY_PATH)
 
-HOST_KEY = paramiko.RSAKey(filename=HOST_KEY_PATH)
+HOST_KEY = load_host_key()
 PORT = 2222
-LOG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs', 'honeypot_logs.json')
+# Local fallback log, one JSON event per line (append-only)
+LOG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs', 'honeypot_logs.jsonl')
+LOG_BATCH_SIZE = 200 # Max events forwarded per request
+LOG_BATCH_WINDOW = 0.2 # Seconds to wait for a burst to fill a batch
+LOG_QUEUE_SIZE = 10000 # Events buffered while the controller is slow or down
+LOG_DROP_REPORT_INTERVAL = 60 # Seconds between dropped-event warnings
+# High-volume events that are dropped rather than waited for when LOG_QUEUE is full
+DROPPABLE_EVENTS = frozenset({'LOGIN_ATTEMPT', 'CMD_EXEC'})
 MAX_ATTEMPTS = 5
 BLOCK_DURATION = 60
-MAX_CONCURRENT_CONNECTIONS = 50
+MAX_CONCURRENT_CONNECTIONS = 50 # Across all workers: start_workers splits it between them
+LISTEN_BACKLOG = 128 # Pending handshakes the kernel queues during connection bursts
+MAX_HANDSHAKES_PER_SEC = 20 # New sessions started per second; bursts wait in the listen backlog
+# Listener processes sharing PORT via SO_REUSEPORT (key exchange is GIL-bound CPU work)
+HONEYPOT_WORKERS = int(os.environ.get('HONEYPOT_WORKERS', os.cpu_count() or 1))
+BLOCKLIST_SYNC_INTERVAL = 10 # Base seconds between blocklist polls on a fast link
+# (average poll RTT upper bound in seconds, interval multiplier), checked in order
+BLOCKLIST_BACKOFF = ((0.25, 1), (1.0, 4), (float('inf'), 10))
+EVAL_CACHE_SIZE = 4096 # Memoized AI verdicts for repeated commands
+EVAL_CACHE_HISTORY = 3 # Previous commands included in the verdict cache key
+EVAL_BATCH_SIZE = 32 # Max command evaluations sent to the controller per request
+EVAL_BATCH_WINDOW = 0.02 # Seconds to wait for concurrent sessions to fill a batch
+EVAL_BATCH_SENDERS = 8 # Batches in flight at once while the brain is thinking
+EVAL_TIMEOUT = 5.5 # Strict latency budget per command verdict
 IDLE_TIMEOUT = 120  # Server shuts down if no activity for 120s
 CONNECTION_TIMEOUT = 60 # Disconnect client after 60s
 ALLOW_ALL_CREDS = os.environ.get('ALLOW_ALL_CREDS', 'False').lower() == 'true' # Stage 3: Allow all for deception
+# High-value bait credentials that are let into the shell when ALLOW_ALL_CREDS is off
+BAIT_CREDS = frozenset({('admin', 'admin'), ('root', '1234')})
+
+# Commands whose verdict is known without asking the AI (first word, no shell chaining).
+# ls and cd stay with the AI: they are where it deploys dynamic decoys.
+SAFE_RECON = frozenset({'pwd', 'whoami', 'id', 'uname', 'hostname', 'date', 'uptime', 'ps', 'w', 'who', 'clear', 'history', 'env'})
+HARD_BLOCK = frozenset({'rm', 'mkfs', 'dd'})
+SHELL_METACHARS = frozenset(';&|`$<>()\n')
 
 # Stage 4: Distributed Config
 CONTROLLER_URL = os.environ.get('CONTROLLER_URL') # e.g. http://controller:5000/receive_log
@@ -46,96 +112,281 @@ API_KEY = os.environ.get('API_KEY')
 if not API_KEY:
     logger.warning("API_KEY environment variable is missing! Ensure it is set before deployment.")
 
+def make_controller_session():
+    """
+    Builds the keep-alive session used for all controller traffic.
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=MAX_CONCURRENT_CONNECTIONS, max_retries=0)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if API_KEY:
+        session.headers['X-API-KEY'] = API_KEY
+    return session
+
+# Controller bodies are pre-encoded with json_utils.dumps instead of requests' json=
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+# Shared keep-alive session for all controller traffic (log forwarding, blocklist
+# sync, command evaluation) so each call reuses a pooled connection
+CONTROLLER_SESSION = make_controller_session()
+
 # Globals
 SERVER_RUNNING = True
 BLOCKED_IPS = {}
-GLOBAL_BLOCKED_IPS = set()
-CLIENT_THREADS = []
-LOG_QUEUE = queue.Queue()
+BLOCK_LOCK = threading.Lock() # Serializes block_ip; is_blocked reads unlocked
+# Replaced wholesale (never mutated) so readers need no lock
+GLOBAL_BLOCKED_IPS = frozenset()
+CLIENT_THREADS = weakref.WeakSet() # Finished session threads drop out on their own
+READY_EVENT = threading.Event() # Set once start_server is listening
+LOG_QUEUE = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+dropped_logs = 0 # Events discarded because LOG_QUEUE was full, since the last report
+DROPPED_LOGS_LOCK = threading.Lock()
 connection_semaphore = threading.Semaphore(MAX_CONCURRENT_CONNECTIONS)
+# (command, cwd, recent commands) -> decision, in least-recently-used order
+EVAL_CACHE = OrderedDict()
+EVAL_CACHE_LOCK = threading.Lock()
+# Cache key -> Future of a verdict already requested by another session
+PENDING_EVALS = {}
 
 class BlocklistSyncer(threading.Thread):
     def __init__(self):
         super().__init__()
         self.daemon = True
         self.running = True
+        self.epoch = None # Controller boot the version belongs to (see BLOCKLIST_EPOCH there)
+        self.version = None # Controller blocklist version held, None before the first sync
+        self.synced = frozenset() # The controller's list as of self.version
+        self.rtts = deque(maxlen=3) # Durations of the last successful polls
 
     def run(self):
         while self.running and SERVER_RUNNING:
             if CONTROLLER_URL:
                 try:
-                    # Construct URL (assuming /blocklist is relative to base, or hardcoded)
-                    # controller_server.py exposes /blocklist
-                    base_url = CONTROLLER_URL.rsplit('/', 1)[0]
-                    url = f"{base_url}/blocklist"
-                    
-                    response = requests.get(url, timeout=5)
-                    if response.status_code == 200:
-                        ips = response.json()
-                        global GLOBAL_BLOCKED_IPS
-                        GLOBAL_BLOCKED_IPS = set(ips)
-                        # logger.debug(f"Synced blocklist: {len(GLOBAL_BLOCKED_IPS)} IPs")
+                    self.sync_once()
                 except Exception as e:
                     logger.error(f"Blocklist sync failed: {e}")
             
-            time.sleep(10)
+            time.sleep(self.interval())
+
+    def sync_once(self):
+        """
+        Polls the controller's /blocklist once and applies the response.
+        """
+        # Construct URL (assuming /blocklist is relative to base, or hardcoded)
+        # controller_server.py exposes /blocklist
+        base_url = CONTROLLER_URL.rsplit('/', 1)[0]
+        url = f"{base_url}/blocklist"
+        
+        # After the first full fetch only the changes since our version are sent,
+        # and an unchanged blocklist comes back as an empty 304
+        headers = None
+        params = None
+        if self.version is not None:
+            headers = {'If-None-Match': f'"{self.epoch}.{self.version}"'}
+            params = {'since': f"{self.epoch}.{self.version}"}
+        started = time.monotonic()
+        response = CONTROLLER_SESSION.get(url, headers=headers, params=params, timeout=5)
+        if response.status_code == 200:
+            if not self.apply(loads(response.content), response.headers.get('ETag')):
+                # Delta from another controller boot: start over with the full list
+                response = CONTROLLER_SESSION.get(url, timeout=5)
+                if response.status_code == 200:
+                    self.apply(loads(response.content), response.headers.get('ETag'))
+            # logger.debug(f"Synced blocklist: {len(GLOBAL_BLOCKED_IPS)} IPs")
+        if response.status_code in (200, 304):
+            self.rtts.append(time.monotonic() - started)
+
+    def apply(self, body, etag=None):
+        """
+        Applies a /blocklist response: a full list (first sync, versioned by
+        its ETag), or an {"epoch", "version", "added", "removed"} delta or
+        {"epoch", "version", "full"} snapshot. Local additions from
+        block_globally are dropped, as the controller's list replaces them.
+        Returns False, applying nothing, for a delta from a different
+        controller boot than the list held; the caller then refetches in full.
+        """
+        global GLOBAL_BLOCKED_IPS
+        if isinstance(body, list):
+            self.synced = frozenset(body)
+            self.epoch, self.version = self.parse_tag(etag)
+        elif 'full' in body:
+            self.synced = frozenset(body['full'])
+            self.epoch = body.get('epoch')
+            self.version = body['version']
+        elif body.get('epoch') != self.epoch:
+            self.epoch = self.version = None
+            return False
+        else:
+            self.synced = (self.synced - set(body['removed'])) | set(body['added'])
+            self.version = body['version']
+        GLOBAL_BLOCKED_IPS = self.synced
+        return True
+
+    @staticmethod
+    def parse_tag(etag):
+        """
+        Splits a '"<epoch>.<version>"' ETag into (epoch, version), or (None, None)
+        if it is missing or malformed, so the next poll fetches the full list.
+        """
+        epoch, _, version = (etag or '').strip('"').partition('.')
+        if not epoch or not version.isdigit():
+            return None, None
+        return epoch, int(version)
+
+    def interval(self):
+        """
+        Seconds until the next poll: slow controllers are polled less often so
+        requests don't pile up behind them.
+        """
+        if not self.rtts:
+            return BLOCKLIST_SYNC_INTERVAL
+        avg_rtt = sum(self.rtts) / len(self.rtts)
+        for max_rtt, multiplier in BLOCKLIST_BACKOFF:
+            if avg_rtt < max_rtt:
+                return BLOCKLIST_SYNC_INTERVAL * multiplier
 
 class LogWriter(threading.Thread):
     def __init__(self):
         super().__init__()
         self.daemon = True
         self.running = True
+        self.next_drop_report = time.monotonic() + LOG_DROP_REPORT_INTERVAL
 
     def run(self):
         while self.running or not LOG_QUEUE.empty():
+            self._report_drops()
             try:
-                entry = LOG_QUEUE.get(timeout=1.0)
-                self._write_log(entry)
-                LOG_QUEUE.task_done()
+                batch = [LOG_QUEUE.get(timeout=1.0)]
             except queue.Empty:
                 continue
+            # Drain whatever else arrives within the batch window
+            deadline = time.monotonic() + LOG_BATCH_WINDOW
+            while len(batch) < LOG_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(LOG_QUEUE.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._write_batch(batch)
             except Exception as e:
                 logger.error(f"LogWriter error: {e}")
-
-    def _write_log(self, entry):
-        # Add Sensor ID
-        entry['sensor_id'] = SENSOR_ID
+            finally:
+                for _ in batch:
+                    LOG_QUEUE.task_done()
+
+    def _report_drops(self):
+        # Surfaces queue overflow so operators can size LOG_QUEUE_SIZE
+        global dropped_logs
+        if time.monotonic() < self.next_drop_report:
+            return
+        self.next_drop_report = time.monotonic() + LOG_DROP_REPORT_INTERVAL
+        with DROPPED_LOGS_LOCK:
+            dropped, dropped_logs = dropped_logs, 0
+        if dropped:
+            logger.warning(f"Log queue full: dropped {dropped} events in the last {LOG_DROP_REPORT_INTERVAL}s")
+
+    def _write_batch(self, batch):
+        # Add Sensor ID and render the epoch timestamps from log_event as ISO 8601
+        for entry in batch:
+            entry['timestamp'] = datetime.fromtimestamp(entry['timestamp']).isoformat()
+            entry['sensor_id'] = SENSOR_ID
         
-        # 1. Try forwarding to Controller
+        # 1. Try forwarding the whole batch to the Controller in one request
         if CONTROLLER_URL:
             try:
-                headers = {'X-API-KEY': API_KEY, 'Content-Type': 'application/json'}
-                response = requests.post(CONTROLLER_URL, json=entry, headers=headers, timeout=3)
+                base_url = CONTROLLER_URL.rsplit('/', 1)[0]
+                response = CONTROLLER_SESSION.post(f"{base_url}/receive_logs", data=dumps({"events": batch}), headers=JSON_HEADERS, timeout=3)
                 if response.status_code != 200:
                     logger.warning(f"Controller returned {response.status_code}")
                     # Fallback to local
-                    self._write_local(entry)
+                    self._write_local(batch)
                 return # Success (or handled failure)
             except requests.RequestException as e:
                 logger.error(f"Log forwarding failed: {e}")
                 # Fallback to local
-                self._write_local(entry)
+                self._write_local(batch)
         else:
-            self._write_local(entry)
+            self._write_local(batch)
 
-    def _write_local(self, entry):
+    def _write_local(self, entries):
+        # One append and one fsync per batch, however large the log has grown
         try:
-            logs = []
-            if os.path.exists(LOG_FILE):
-                try:
-                    with open(LOG_FILE, 'r') as f:
-                        logs = json.load(f)
-                except json.JSONDecodeError:
-                    pass
-            
-            logs.append(entry)
-            
-            with open(LOG_FILE, 'w') as f:
-                json.dump(logs, f, indent=4)
+            append_records(entries, LOG_FILE, fsync=True)
         except Exception as e:
             logger.error(f"Failed to write local log: {e}")
 
+class EvalBatcher(threading.Thread):
+    """
+    Collects command evaluations from all sessions and sends them to the
+    controller's /evaluate_commands endpoint in micro-batches. Batches are
+    posted from a small pool so a slow brain verdict doesn't hold up the next batch.
+    """
+    def __init__(self):
+        super().__init__()
+        self.daemon = True
+        self.running = True
+        self.queue = queue.Queue()
+        self.start_lock = threading.Lock()
+
+    def submit(self, payload):
+        """
+        Queues one /evaluate_command payload. Returns a Future resolving to the
+        decision dict, or None if the controller could not evaluate it.
+        The thread starts on first use, so CONTROLLER_URL may be set after import.
+        """
+        with self.start_lock:
+            if self.ident is None:
+                self.start()
+        future = concurrent.futures.Future()
+        self.queue.put((payload, future))
+        return future
+
+    def run(self):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=EVAL_BATCH_SENDERS) as senders:
+            while self.running:
+                try:
+                    batch = [self.queue.get(timeout=1.0)]
+                except queue.Empty:
+                    continue
+                deadline = time.monotonic() + EVAL_BATCH_WINDOW
+                while len(batch) < EVAL_BATCH_SIZE:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self.queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+                senders.submit(self._send_batch, batch)
+
+    def _send_batch(self, batch):
+        try:
+            base_url = CONTROLLER_URL.rsplit('/', 1)[0]
+            response = CONTROLLER_SESSION.post(f"{base_url}/evaluate_commands", data=dumps({"batch": [payload for payload, _ in batch]}), headers=JSON_HEADERS, timeout=EVAL_TIMEOUT)
+            if response.status_code != 200:
+                raise requests.RequestException(f"Controller returned {response.status_code}")
+            results = loads(response.content)["results"]
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        # Every future is resolved, even if the response is short or malformed,
+        # so no session waits out the full EVAL_TIMEOUT
+        for i, (_, future) in enumerate(batch):
+            try:
+                result = results[i]
+                decision = result["decision"] if result.get("status") == 200 else None
+            except (IndexError, KeyError, TypeError, AttributeError):
+                future.set_exception(requests.RequestException(f"Controller returned no result for batch item {i}"))
+                continue
+            future.set_result(decision)
+
 # Initialize Log Writer
+migrate_array_to_jsonl(os.path.splitext(LOG_FILE)[0] + '.json', LOG_FILE)
 log_writer = LogWriter()
 log_writer.start()
 
@@ -144,19 +395,27 @@ blocklist_syncer = BlocklistSyncer()
 if CONTROLLER_URL:
     blocklist_syncer.start()
 
-def log_event(event_type, ip, username=None, password=None, details=None):
+# Initialize Evaluation Batcher (started by its first submit)
+eval_batcher = EvalBatcher()
+
+def log_event(event_type, ip, **fields):
     """
-    Queues an event to be logged.
+    Queues an event to be logged. Keyword fields are stored as-is; the
+    timestamp is taken as epoch seconds and formatted later by LogWriter,
+    keeping string work off the session thread.
+    LOG_QUEUE is bounded: when it is full, high-volume events are dropped
+    (and counted) and the rest wait briefly for room before being dropped.
     """
-    entry = {
-        "timestamp": datetime.now().isoformat(),
-        "event_type": event_type,
-        "ip": ip,
-        "username": username,
-        "password": password,
-        "details": details
-    }
-    LOG_QUEUE.put(entry)
+    global dropped_logs
+    entry = {"timestamp": time.time(), "event_type": event_type, "ip": ip, **fields}
+    try:
+        if event_type in DROPPABLE_EVENTS:
+            LOG_QUEUE.put_nowait(entry)
+        else:
+            LOG_QUEUE.put(entry, timeout=0.5)
+    except queue.Full:
+        with DROPPED_LOGS_LOCK:
+            dropped_logs += 1
 
 def is_blocked(ip):
     """
@@ -166,28 +425,135 @@ def is_blocked(ip):
     if ip in GLOBAL_BLOCKED_IPS:
         return True
         
-    if ip in BLOCKED_IPS:
-        if BLOCKED_IPS[ip]['attempts'] >= MAX_ATTEMPTS:
-            if time.time() < BLOCKED_IPS[ip]['until']:
-                return True
-            else:
-                del BLOCKED_IPS[ip]
+    # Unlocked read: a concurrent block_ip can at worst leave the attempt
+    # count one behind, which only delays a block by one attempt
+    record = BLOCKED_IPS.get(ip)
+    if record and record['attempts'] >= MAX_ATTEMPTS:
+        if time.time() < record['until']:
+            return True
+        BLOCKED_IPS.pop(ip, None)
     return False
 
 def block_ip(ip):
     """
     Checks if an IP has reached the threshold and blocks it if necessary.
     """
-    if ip not in BLOCKED_IPS:
-        BLOCKED_IPS[ip] = {'attempts': 0, 'until': 0}
-    
-    BLOCKED_IPS[ip]['attempts'] += 1
-    
-    if BLOCKED_IPS[ip]['attempts'] >= MAX_ATTEMPTS:
-        BLOCKED_IPS[ip]['until'] = time.time() + BLOCK_DURATION
+    with BLOCK_LOCK:
+        record = BLOCKED_IPS.setdefault(ip, {'attempts': 0, 'until': 0})
+        record['attempts'] += 1
+        newly_blocked = record['attempts'] >= MAX_ATTEMPTS
+        if newly_blocked:
+            record['until'] = time.time() + BLOCK_DURATION
+
+    if newly_blocked:
         logger.info(f"Blocked IP {ip} for {BLOCK_DURATION}s")
         log_event("BLOCK", ip, details=f"Blocked for {BLOCK_DURATION}s after {MAX_ATTEMPTS} attempts")
 
+def block_globally(ip):
+    """
+    Adds ip to the local copy of the global blocklist until the next sync.
+    """
+    global GLOBAL_BLOCKED_IPS
+    with BLOCK_LOCK:
+        GLOBAL_BLOCKED_IPS = GLOBAL_BLOCKED_IPS | {ip}
+
+def _cached_eval(key):
+    with EVAL_CACHE_LOCK:
+        decision = EVAL_CACHE.get(key)
+        if decision is not None:
+            EVAL_CACHE.move_to_end(key)
+        return decision
+
+def _store_eval(key, decision):
+    with EVAL_CACHE_LOCK:
+        EVAL_CACHE[key] = decision
+        EVAL_CACHE.move_to_end(key)
+        if len(EVAL_CACHE) > EVAL_CACHE_SIZE:
+            EVAL_CACHE.popitem(last=False)
+
+def local_verdict(cmd):
+    """
+    Returns "ALLOW" or "BLOCK" for commands that need no AI round trip, or
+    None if the AI should decide. Anything with shell chaining or
+    substitution goes to the AI (e.g. "id; wget ...").
+    """
+    if not SHELL_METACHARS.isdisjoint(cmd):
+        return None
+    first = cmd.split(None, 1)[0]
+    if first in SAFE_RECON:
+        return "ALLOW"
+    if first in HARD_BLOCK:
+        return "BLOCK"
+    return None
+
+def _finish_eval(key, future):
+    with EVAL_CACHE_LOCK:
+        PENDING_EVALS.pop(key, None)
+    if not future.cancelled() and future.exception() is None and future.result() is not None:
+        _store_eval(key, future.result())
+
+def _report_reused_block(ip, cmd, decision):
+    """
+    The controller only blocks the IP in the payload it evaluated, so a BLOCK
+    verdict reused for another session is reported here for the global blocklist.
+    """
+    if decision and decision.get("action") == "BLOCK":
+        log_event("BLOCK", ip, details=f"Command blocked by a shared AI verdict: {cmd}")
+    return decision
+
+def evaluate_command(ip, cmd, simulator, session_history):
+    """
+    Asks the controller for a pre-execution verdict on cmd.
+    Bots replay the same commands endlessly, so verdicts are memoized per
+    (command, cwd, previous commands), and sessions asking the same question
+    at the same time share one in-flight request. Only real controller
+    answers are cached, never fail-open fallbacks.
+    Returns the decision dict, or None to fail open.
+    """
+    recent = tuple(h["command"] for h in session_history[-(EVAL_CACHE_HISTORY + 1):-1])
+    key = (cmd, simulator.current_path, recent)
+    decision = _cached_eval(key)
+    if decision is not None:
+        return _report_reused_block(ip, cmd, decision)
+
+    try:
+        with EVAL_CACHE_LOCK:
+            future = PENDING_EVALS.get(key)
+            is_new = future is None
+            if is_new:
+                # Filesystem Context Optimization (Current Dir Only)
+                fs_context = {}
+                try:
+                    curr_contents = simulator.fs.list_dir(simulator.current_path)
+                    fs_context = {
+                        "path": simulator.current_path,
+                        "contents": curr_contents if curr_contents else []
+                    }
+                except Exception:
+                    pass
+
+                eval_payload = {
+                    "ip": ip,
+                    "command": cmd,
+                    "history": session_history,
+                    "filesystem_context": fs_context
+                }
+                future = eval_batcher.submit(eval_payload)
+                PENDING_EVALS[key] = future
+        if is_new:
+            # Outside the lock: the callback runs inline if the future is already done
+            future.add_done_callback(lambda f: _finish_eval(key, f))
+
+        # Strict 5.5-second timeout latency control to allow Mistral inference roundtrip
+        decision = future.result(timeout=EVAL_TIMEOUT)
+        # Followers share the leader's answer, which only blocked the leader's IP
+        return decision if is_new else _report_reused_block(ip, cmd, decision)
+    except (concurrent.futures.TimeoutError, requests.Timeout):
+        logger.warning("AI Evaluation timeout - Fail Open (ALLOW default)")
+    except Exception as e:
+        logger.error(f"AI Evaluation failed - Fail Open - error: {e}")
+    return None
+
 class HoneypotServer(paramiko.ServerInterface):
     """
     Paramiko Server Interface implementation for the Honeypot.
@@ -207,15 +573,12 @@ class HoneypotServer(paramiko.ServerInterface):
             return paramiko.AUTH_FAILED
             
         logger.info(f"Login attempt: {self.client_ip} - {username}:{password}")
-        log_event("LOGIN_ATTEMPT", self.client_ip, username, password)
+        log_event("LOGIN_ATTEMPT", self.client_ip, username=username, password=password)
         
         # Stage 3: Interactive Deception
         # If ALLOW_ALL_CREDS is True, everyone gets in.
         # Otherwise, ONLY allow specific high-value bait credentials to get in.
-        is_bait_cred = (username == 'admin' and password == 'admin') or \
-                       (username == 'root' and password == '1234')
-                       
-        if ALLOW_ALL_CREDS or is_bait_cred:
+        if ALLOW_ALL_CREDS or (username, password) in BAIT_CREDS:
             # Prevent blocking for successful logins during deception
             return paramiko.AUTH_SUCCESSFUL
             
@@ -235,13 +598,9 @@ class HoneypotServer(paramiko.ServerInterface):
 def handle_connection(client_sock, client_addr):
     """
     Handles an individual client connection with strict resource management.
+    The caller must already hold a connection_semaphore slot; it is released here.
     """
     ip = client_addr[0]
-    
-    if not connection_semaphore.acquire(blocking=False):
-        logger.warning(f"Max connections reached. Rejecting {ip}")
-        client_sock.close()
-        return
 
     transport = None
     try:
@@ -289,117 +648,105 @@ def handle_connection(client_sock, client_addr):
             if not SERVER_RUNNING:
                 break
                 
-            if chan.recv_ready():
-                data = chan.recv(1024)
-                if not data:
-                    break
-                
-                # Simple Char Echo & Buffer
-                chars = data.decode('utf-8', errors='ignore')
-                should_exit = False
-                
-                # Check if we should block input for AI evaluation
-                # Since we process on enter, we process the whole command synchronously
-                # and don't accept new data until it finishes.
-                
-                for char in chars:
-                    # Handle enter
-                    if char in ('\r', '\n'):
-                        chan.send("\r\n")
-                        cmd = buf.strip()
-                        if cmd:
-                            logger.info(f"Client {ip} executed: {cmd}")
-                            
-                            # Add to session history
-                            session_history.append({"command": cmd})
+            # Park in select() until input (or EOF) arrives instead of sleeping between
+            # polls; the timeout only re-checks SERVER_RUNNING and transport liveness.
+            # select() rather than chan.settimeout() keeps sends blocking as before.
+            readable, _, _ = select.select([chan], [], [], 1.0)
+            if not readable:
+                continue
+            data = chan.recv(1024)
+            if not data:
+                break
+            
+            # Simple Char Echo & Buffer
+            chars = data.decode('utf-8', errors='ignore')
+            should_exit = False
+            
+            # Check if we should block input for AI evaluation
+            # Since we process on enter, we process the whole command synchronously
+            # and don't accept new data until it finishes.
+            
+            # Everything echoed for this chunk goes out in one chan.send (one SSH
+            # packet) instead of one per keystroke; it is flushed early only
+            # before a command runs, so the newline shows while the AI thinks.
+            echo_out = []
+            for char in chars:
+                # Handle enter
+                if char in ('\r', '\n'):
+                    echo_out.append("\r\n")
+                    cmd = buf.strip()
+                    if cmd:
+                        chan.send("".join(echo_out))
+                        echo_out.clear()
+                        logger.info(f"Client {ip} executed: {cmd}")
+                        
+                        # Add to session history
+                        session_history.append({"command": cmd})
+                        
+                        # Pre-Execution AI Evaluation
+                        decision = None
+                        if CONTROLLER_URL:
+                            verdict = local_verdict(cmd)
+                            if verdict == "BLOCK":
+                                decision = {"action": "BLOCK"}
+                                # The controller never saw this command, so report the block for the global blocklist
+                                log_event("BLOCK", ip, details=f"Destructive command blocked locally: {cmd}")
+                            elif verdict is None:
+                                decision = evaluate_command(ip, cmd, server.simulator, session_history)
+                        if decision:
+                            action = decision.get("action", "ALLOW")
                             
-                            # Pre-Execution AI Evaluation
-                            if CONTROLLER_URL:
-                                try:
-                                    # Filesystem Context Optimization (Current Dir Only)
-                                    fs_context = {}
-                                    try:
-                                        curr_contents = server.simulator.fs.list_dir(server.simulator.current_path)
-                                        fs_context = {
-                                            "path": server.simulator.current_path,
-                                            "contents": curr_contents if curr_contents else []
-                                        }
-                                    except Exception:
-                                        pass
-
-                                    eval_payload = {
-                                        "ip": ip,
-                                        "command": cmd,
-                                        "history": session_history,
-                                        "filesystem_context": fs_context
-                                    }
-                                    
-                                    # Controller proxy URL
-                                    eval_url = CONTROLLER_URL.replace("/receive_log", "/evaluate_command")
-                                    headers = {'X-API-KEY': API_KEY, 'Content-Type': 'application/json'}
-                                    
-                                    # Strict 5.5-second timeout latency control to allow Mistral inference roundtrip
-                                    eval_response = requests.post(eval_url, json=eval_payload, headers=headers, timeout=5.5)
-                                    
-                                    if eval_response.status_code == 200:
-                                        decision = eval_response.json()
-                                        action = decision.get("action", "ALLOW")
-                                        
-                                        if action == "BLOCK":
-                                            logger.warning(f"AI Enforcement: Terminating session for {ip} due to blocked command: {cmd}")
-                                            chan.send("\r\nConnection terminated by security policy.\r\n")
-                                            block_ip(ip)
-                                            # Instantly apply to local cache to prevent race condition reconnection
-                                            global GLOBAL_BLOCKED_IPS
-                                            GLOBAL_BLOCKED_IPS.add(ip)
-                                            # Close the connection immediately
-                                            should_exit = True
-                                            break
-                                            
-                                        # ALLOW action - check for dynamic decoy
-                                        decoy = decision.get("dynamic_decoy", {})
-                                        if decoy.get("should_deploy") and decoy.get("path") and decoy.get("content"):
-                                            # Deploy the decoy before executing the command so the attacker can see it
-                                            logger.info(f"AI Deception: Deploying decoy at {decoy['path']}")
-                                            server.simulator.fs.deploy_decoy(decoy["path"], decoy["content"])
-                                            
-                                except requests.Timeout:
-                                    logger.warning("AI Evaluation timeout - Fail Open (ALLOW default)")
-                                except Exception as e:
-                                    logger.error(f"AI Evaluation failed - Fail Open - error: {e}")
+                            if action == "BLOCK":
+                                logger.warning(f"AI Enforcement: Terminating session for {ip} due to blocked command: {cmd}")
+                                echo_out.append("\r\nConnection terminated by security policy.\r\n")
+                                block_ip(ip)
+                                # Instantly apply to local cache to prevent race condition reconnection
+                                block_globally(ip)
+                                # Close the connection immediately
+                                should_exit = True
+                                break
                                 
+                            # ALLOW action - check for dynamic decoy
+                            decoy = decision.get("dynamic_decoy", {})
+                            if decoy.get("should_deploy") and decoy.get("path") and decoy.get("content"):
+                                # Deploy the decoy before executing the command so the attacker can see it
+                                logger.info(f"AI Deception: Deploying decoy at {decoy['path']}")
+                                server.simulator.fs.deploy_decoy(decoy["path"], decoy["content"])
                             
-                            output = server.simulator.execute_command(cmd)
+                        
+                        output = server.simulator.execute_command(cmd)
+                        
+                        # Logging CMD_EXEC
+                        log_event("CMD_EXEC", ip, command=cmd, output_preview=output[:50])
+                        
+                        if output == "EXIT":
+                            should_exit = True
+                            break
                             
-                            # Logging CMD_EXEC
-                            log_event("CMD_EXEC", ip, details=f"Cmd: {cmd}, Out: {output[:50]}...")
+                        # Convert output newlines for SSH
+                        output = output.replace('\n', '\r\n')
+                        if output:
+                            echo_out.append(output + "\r\n")
                             
-                            if output == "EXIT":
-                                should_exit = True
-                                break
-                                
-                            # Convert output newlines for SSH
-                            output = output.replace('\n', '\r\n')
-                            if output:
-                                chan.send(output + "\r\n")
-                                
-                        buf = ""
-                        chan.send(f"{server.simulator.user}@{server.simulator.hostname}:{server.simulator.current_path}# ")
-                    
-                    # Handle Backspace (del/backspace char)
-                    elif char in ('\x7f', '\x08'):
-                        if buf:
-                            buf = buf[:-1]
-                            # Visual backspace
-                            chan.send('\x08 \x08')
-                    else:
-                        buf += char
-                        chan.send(char)
+                    buf = ""
+                    echo_out.append(f"{server.simulator.user}@{server.simulator.hostname}:{server.simulator.current_path}# ")
                 
-                if should_exit:
-                    break
-                    
-            time.sleep(0.1)
+                # Handle Backspace (del/backspace char)
+                elif char in ('\x7f', '\x08'):
+                    if buf:
+                        buf = buf[:-1]
+                        # Visual backspace
+                        echo_out.append('\x08 \x08')
+                else:
+                    buf += char
+                    echo_out.append(char)
+
+            if echo_out:
+                chan.send("".join(echo_out))
+            
+            if should_exit:
+                break
+
 
         duration = round(time.time() - start_time, 1)
         log_event("SHELL_SESSION_END", ip, details=f"Session duration: {duration} seconds")
@@ -442,6 +789,9 @@ def start_server():
 
     sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, 'SO_REUSEPORT'):
+        # Lets every worker process bind PORT; the kernel spreads SYNs across them
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
     
     try:
         sock.bind(('0.0.0.0', PORT))
@@ -449,17 +799,17 @@ def start_server():
         logger.error(f"Bind failed: {e}")
         return
         
-    sock.listen(5)
+    sock.listen(LISTEN_BACKLOG)
     sock.settimeout(2.0) # check for shutdown
     
     logger.info(f"Honeypot listening on port {PORT}...")
+    READY_EVENT.set()
     
     last_activity_time = time.time()
+    # Start times of the last MAX_HANDSHAKES_PER_SEC admitted sessions
+    recent_handshakes = deque(maxlen=MAX_HANDSHAKES_PER_SEC)
     
     while SERVER_RUNNING:
-        # Clean up dead threads
-        CLIENT_THREADS[:] = [t for t in CLIENT_THREADS if t.is_alive()]
-        
         # Update last activity
         if CLIENT_THREADS:
             last_activity_time = time.time()
@@ -469,11 +819,26 @@ def start_server():
             last_activity_time = time.time() # Reset activity on connection
             
             logger.info(f"Accepted connection from {client_addr[0]}")
+
+            # Admission control before spawning: over-capacity clients are
+            # dropped here instead of costing a thread each
+            if not connection_semaphore.acquire(blocking=False):
+                logger.warning(f"Max connections reached. Rejecting {client_addr[0]}")
+                client_sock.close()
+                continue
+
+            # Pace key exchanges: each Transport costs tens of ms of RSA/DH CPU,
+            # so a SYN burst is spread out rather than started all at once
+            if len(recent_handshakes) == MAX_HANDSHAKES_PER_SEC:
+                wait = 1.0 - (time.monotonic() - recent_handshakes[0])
+                if wait > 0:
+                    time.sleep(wait)
+            recent_handshakes.append(time.monotonic())
             
             t = threading.Thread(target=handle_connection, args=(client_sock, client_addr))
             t.daemon = True
             t.start()
-            CLIENT_THREADS.append(t)
+            CLIENT_THREADS.add(t)
             
         except socket.timeout:
             continue
@@ -487,11 +852,68 @@ def start_server():
     log_writer.running = False
     log_writer.join()
     blocklist_syncer.running = False # Stop syncer
-    blocklist_syncer.join(timeout=1.0)
+    if blocklist_syncer.is_alive(): # Never started without CONTROLLER_URL
+        blocklist_syncer.join(timeout=1.0)
+    eval_batcher.running = False
+    if eval_batcher.is_alive():
+        eval_batcher.join(timeout=1.0)
     
-    for t in CLIENT_THREADS:
+    for t in list(CLIENT_THREADS):
         t.join(timeout=1.0)
     logger.info("Server stopped.")
 
-if __name__ == "__main__":
+def _reset_after_fork():
+    """
+    Gives a forked worker its own copies of the state that does not survive
+    fork(): background threads, the log queue and pooled controller sockets.
+    """
+    global LOG_QUEUE, CONTROLLER_SESSION, log_writer, blocklist_syncer, eval_batcher, dropped_logs
+    LOG_QUEUE = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    dropped_logs = 0
+    PENDING_EVALS.clear()
+    CONTROLLER_SESSION = make_controller_session()
+    log_writer = LogWriter()
+    log_writer.start()
+    blocklist_syncer = BlocklistSyncer()
+    eval_batcher = EvalBatcher()
+    if CONTROLLER_URL:
+        blocklist_syncer.start()
+
+def start_workers(count=HONEYPOT_WORKERS):
+    """
+    Runs count listener processes on PORT. Each worker keeps its own local
+    blocklist and log queue; logs and global blocks still meet at the controller.
+    MAX_CONCURRENT_CONNECTIONS is divided between the workers, so the host as a
+    whole still holds at most that many sessions.
+    Falls back to a single process where fork() or SO_REUSEPORT is unavailable.
+    """
+    global connection_semaphore
+    if count <= 1 or not hasattr(os, 'fork') or not hasattr(socket, 'SO_REUSEPORT'):
+        start_server()
+        return
+
+    # Set before forking so every worker inherits its share
+    connection_semaphore = threading.Semaphore(max(1, MAX_CONCURRENT_CONNECTIONS // count))
+    children = []
+    for _ in range(count - 1):
+        pid = os.fork()
+        if pid == 0:
+            # Never fall through into the parent's loop, even on error
+            try:
+                _reset_after_fork()
+                start_server()
+            finally:
+                os._exit(0)
+        children.append(pid)
+
+    logger.info(f"Started {count} honeypot workers")
     start_server()
+    for pid in children:
+        try:
+            os.kill(pid, signal.SIGINT)
+            os.waitpid(pid, 0)
+        except OSError:
+            pass
+
+if __name__ == "__main__":
+    start_workers()
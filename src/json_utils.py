@@ -0,0 +1,207 @@
+import json
+import logging
+import os
+
+# orjson is optional: it is several times faster than the stdlib, but the
+# stdlib fallback keeps every module working on minimal installs.
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# ijson is optional too: it streams legacy JSON array files item by item
+# instead of decoding the whole array at once.
+try:
+    import ijson
+    HAS_IJSON = True
+except ImportError:
+    HAS_IJSON = False
+
+# Flask is only needed by the servers; scripts use this module without it
+try:
+    from flask.json.provider import DefaultJSONProvider
+except ImportError:
+    DefaultJSONProvider = object
+
+logger = logging.getLogger(__name__)
+
+def loads(data):
+    """
+    Decodes JSON from str or bytes.
+    Raises json.JSONDecodeError on invalid input (orjson's error subclasses it).
+    """
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dumps(obj, indent=False, sort_keys=False):
+    """
+    Encodes obj to UTF-8 JSON bytes. indent=True pretty-prints with 2 spaces.
+    """
+    if HAS_ORJSON:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, option=option)
+    # Compact separators match orjson's output byte for byte
+    return json.dumps(obj, indent=2 if indent else None, separators=None if indent else (',', ':'), sort_keys=sort_keys, ensure_ascii=False).encode('utf-8')
+
+def load_file(path):
+    """
+    Reads and decodes a JSON file in a single read.
+    """
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+def dump_file(obj, path, indent=True):
+    """
+    Encodes obj and writes it to path in a single write.
+    """
+    with open(path, 'wb') as f:
+        f.write(dumps(obj, indent=indent))
+
+def dump_records(objs, path):
+    """
+    Writes records to path as newline-delimited JSON (one compact object per
+    line), replacing any existing file, in a single write.
+    """
+    with open(path, 'wb') as f:
+        f.write(b''.join(dumps(obj) + b'\n' for obj in objs))
+
+def append_records(objs, path, fsync=False):
+    """
+    Appends several records to a newline-delimited JSON file in one write.
+    fsync=True forces the batch to disk before returning (one fsync per call).
+    """
+    data = b''.join(dumps(obj) + b'\n' for obj in objs)
+    if data:
+        with open(path, 'ab') as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+
+def migrate_array_to_jsonl(legacy_path, jsonl_path):
+    """
+    Converts a legacy JSON array log into a JSONL file once, if the JSONL file
+    does not exist yet. The original is kept as .bak so nothing is lost if the
+    conversion is interrupted. Files that are not JSON arrays (e.g. a report
+    that happens to share the name) are left alone, as is an existing .bak.
+    """
+    if not os.path.exists(legacy_path) or os.path.exists(jsonl_path):
+        return
+    try:
+        if not is_json_array(legacy_path):
+            return
+        if os.path.exists(legacy_path + '.bak'):
+            logger.warning(f"Not migrating {legacy_path}: {legacy_path}.bak already exists")
+            return
+        tmp_path = jsonl_path + '.tmp'
+        append_records(iter_records(legacy_path), tmp_path)
+        if os.path.exists(tmp_path):
+            os.replace(tmp_path, jsonl_path)
+        os.replace(legacy_path, legacy_path + '.bak')
+        logger.info(f"Migrated {legacy_path} to {jsonl_path}")
+    except Exception as e:
+        logger.error(f"Failed to migrate legacy log {legacy_path}: {e}")
+
+def _starts_with_array(f):
+    """
+    True if the first non-whitespace byte of f is '['. Rewinds f.
+    """
+    first = f.read(1)
+    while first and first.isspace():
+        first = f.read(1)
+    f.seek(0)
+    return first == b'['
+
+def is_json_array(path):
+    """
+    True if path holds a (legacy) JSON array rather than newline-delimited JSON.
+    """
+    with open(path, 'rb') as f:
+        return _starts_with_array(f)
+
+def iter_records(path):
+    """
+    Yields records from a JSON array file or a newline-delimited JSON file
+    (one object per line). NDJSON is streamed line by line so memory stays
+    bounded by one record; corrupt lines are skipped with a warning.
+    Arrays are streamed too when ijson is installed, else decoded in one go.
+    """
+    with open(path, 'rb') as f:
+        if _starts_with_array(f):
+            if HAS_IJSON:
+                yield from ijson.items(f, 'item', use_float=True)
+            else:
+                yield from loads(f.read())
+            return
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield loads(line)
+            except ValueError:
+                logger.warning(f"Skipping corrupt record at {path}:{line_no}")
+
+class JSONLTail:
+    """
+    Iterates over the records appended to a newline-delimited JSON file since
+    a byte offset. offset advances past each complete line as it is consumed;
+    a trailing line without its newline (a write in progress) is left for the
+    next read. Corrupt lines are skipped with a warning.
+    """
+    def __init__(self, path, offset=0):
+        self.path = path
+        self.offset = offset
+
+    def __iter__(self):
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                start = self.offset
+                self.offset += len(line)
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield loads(line)
+                except ValueError:
+                    logger.warning(f"Skipping corrupt record at {self.path} byte {start}")
+
+def read_request_json(req):
+    """
+    Decodes a Flask request body without caching it.
+    Returns None if the body is empty or not valid JSON.
+    """
+    data = req.get_data(cache=False)
+    if not data:
+        return None
+    try:
+        return loads(data)
+    except ValueError:
+        return None
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by loads/dumps above, so jsonify() and
+    request.get_json() use orjson when it is installed.
+    """
+    def dumps(self, obj, **kwargs):
+        return dumps(obj, indent='indent' in kwargs, sort_keys=self.sort_keys).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+def json_response(obj, status=200):
+    """
+    Builds a Flask JSON response encoded with the fast encoder.
+    """
+    from flask import Response
+    return Response(dumps(obj), status=status, mimetype='application/json')
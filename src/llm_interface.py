@@ -1,17 +1,45 @@
 import requests
-import json
 import logging
+import os
+import sys
 import time
 
+# Ensure src/ siblings are importable regardless of CWD
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from json_utils import dumps, loads
+
 # Configure Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+# Bump whenever generate_prompt's wording changes: cached analyses keyed on it
+# (scripts/run_stage2.py) are then regenerated instead of served stale
+ANALYSIS_PROMPT_VERSION = 1
+
+# Returned by parse_response when the LLM fails or answers with invalid JSON
+ANALYSIS_FALLBACK = {
+    "intent": "unknown",
+    "sophistication": "unknown",
+    "recommended_action": "observe",
+    "summary": "LLM analysis failed."
+}
+
 class LLMInterface:
     """
     Connects to a local LLM API (Ollama) to analyze attacker profiles and enrich behavior reports.
     """
 
+    # Constant parts of the command evaluation prompt, built once
+    _CMD_PROMPT_HEAD = "\nEvaluate command for SSH Honeypot.\nCmd: "
+    _CMD_PROMPT_TAIL = (
+        "\nAction rules: ALLOW recon (ls, pwd). BLOCK destructive (rm, wget).\n"
+        "If ALLOW, optionally provide decoy file.\n"
+        "Respond ONLY in this JSON format:\n"
+        '{"action":"ALLOW"|"BLOCK","reason":"short","risk_score":50,"dynamic_decoy":{"should_deploy":true|false,"path":"/dir/file","content":"fake data"}}\n'
+    )
+
     def __init__(self, model_name="llama3", api_url="http://localhost:11434/api/generate", timeout=30, max_retry=2):
         """
         Initialize LLMInterface.
@@ -26,6 +54,11 @@ class LLMInterface:
         self.api_url = api_url
         self.timeout = timeout
         self.max_retry = max_retry
+        # Shared session keeps HTTP connections to Ollama alive across requests and threads
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=16)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
 
     def check_availability(self):
         """
@@ -37,7 +70,7 @@ class LLMInterface:
         try:
             # Pittle hack: generate empty prompt or version check
             # Better check: GET /api/tags or just a quick generate
-            response = requests.post(self.api_url, json={
+            response = self.session.post(self.api_url, json={
                 "model": self.model_name,
                 "prompt": "hi",
                 "stream": False
@@ -52,19 +85,15 @@ class LLMInterface:
             logger.error(f"Ollama API unavailable: {e}")
             return False
 
-    def generate_prompt(self, ip, profile):
+    def summarize_profile(self, profile):
         """
-        Constructs a prompt for the LLM using a single IP's profile.
+        Reduces a Stage 1 profile to the fields the LLM actually sees.
         
-        Args:
-            ip (str): Attacker IP address.
-            profile (dict): Attacker profile from Stage 1.
-            
         Returns:
-            str: The constructed prompt.
+            dict: Summary profile.
         """
         # Simplify profile for prompt to save tokens/noise
-        summary_profile = {
+        return {
             "total_attempts": profile.get("total_attempts"),
             "duration": profile.get("duration"),
             "unique_usernames": profile.get("unique_usernames"),
@@ -72,12 +101,25 @@ class LLMInterface:
             "patterns": profile.get("patterns"),
             "risk_score": profile.get("risk_score")
         }
+
+    def generate_prompt(self, ip, profile):
+        """
+        Constructs a prompt for the LLM using a single IP's profile.
+        
+        Args:
+            ip (str): Attacker IP address.
+            profile (dict): Attacker profile from Stage 1.
+            
+        Returns:
+            str: The constructed prompt.
+        """
+        summary_profile = self.summarize_profile(profile)
         
         prompt = f"""
 You are a cybersecurity analyst. Analyze this SSH honeypot attacker profile for IP {ip}.
 
 Attacker Profile:
-{json.dumps(summary_profile, indent=2)}
+{dumps(summary_profile, indent=True).decode('utf-8')}
 
 Analysis Requirements:
 1. Determine the likely **intent** (e.g., 'reconnaissance', 'credential_stuffing', 'brute_force', 'automated_bot').
@@ -93,6 +135,8 @@ Do not include markdown formatting or explanations outside the JSON.
     def send_request(self, prompt, num_predict=150):
         """
         Send the prompt to the LLM API with retries.
+        Tokens are streamed so the call returns as soon as the JSON object closes,
+        instead of waiting for the model to use up its num_predict budget.
         
         Returns:
             str: Raw response text or None if failed.
@@ -100,7 +144,7 @@ Do not include markdown formatting or explanations outside the JSON.
         payload = {
             "model": self.model_name,
             "prompt": prompt,
-            "stream": False,
+            "stream": True,
             "format": "json", # Force JSON mode if supported by model/ollama version
             "keep_alive": -1,  # Prevent model from unloading from VRAM after 5 minutes
             "options": {
@@ -113,18 +157,85 @@ Do not include markdown formatting or explanations outside the JSON.
             try:
                 # logger.info(f"Sending request to LLM (Attempt {attempt+1})...")
                 start_time = time.time()
-                response = requests.post(self.api_url, json=payload, timeout=self.timeout)
-                response.raise_for_status()
+                response = self.session.post(self.api_url, data=dumps(payload), headers=JSON_HEADERS, timeout=self.timeout, stream=True)
+                try:
+                    response.raise_for_status()
+                    text = self.read_stream(response)
+                finally:
+                    # Closing mid-stream drops the connection, which also stops Ollama generating
+                    response.close()
                 latency = time.time() - start_time
                 logger.info(f"LLM Inference completed in {latency:.2f}s")
-                return response.json().get("response", "")
-            except requests.RequestException as e:
+                return text
+            except (requests.RequestException, ValueError) as e:
                 logger.warning(f"LLM request failed: {e}")
                 time.sleep(1)
         
         logger.error("Max retries exceeded for LLM request.")
         return None
 
+    def read_stream(self, response):
+        """
+        Joins the "response" tokens of a streamed Ollama reply, stopping at the
+        brace that closes the first top-level JSON object (braces inside
+        strings are ignored).
+        
+        Returns:
+            str: Response text up to and including the closing brace.
+        """
+        parts = []
+        depth = 0
+        in_string = False
+        escaped = False
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = loads(line)
+            token = chunk.get("response", "")
+            for i, char in enumerate(token):
+                if in_string:
+                    if escaped:
+                        escaped = False
+                    elif char == '\\':
+                        escaped = True
+                    elif char == '"':
+                        in_string = False
+                elif char == '"':
+                    in_string = True
+                elif char == '{':
+                    depth += 1
+                elif char == '}' and depth:
+                    depth -= 1
+                    if depth == 0:
+                        parts.append(token[:i + 1])
+                        return "".join(parts)
+            parts.append(token)
+            if chunk.get("done"):
+                break
+        return "".join(parts)
+
+    def load_reply(self, raw_response):
+        """
+        Decodes the model's JSON reply. Requests use format "json", so the reply
+        is normally bare JSON and is decoded directly; markdown fences are only
+        stripped if that first attempt fails.
+        
+        Raises:
+            ValueError: If the reply is not valid JSON even without fences.
+        """
+        try:
+            return loads(raw_response)
+        except ValueError:
+            pass
+        clean_response = raw_response.strip()
+        if clean_response.startswith("```json"):
+            clean_response = clean_response[7:]
+        if clean_response.startswith("```"): # Sometimes just ```
+            clean_response = clean_response[3:]
+        if clean_response.endswith("```"):
+            clean_response = clean_response[:-3]
+        return loads(clean_response.strip())
+
     def parse_response(self, raw_response):
         """
         Parse the LLM response into a Python dictionary.
@@ -132,29 +243,13 @@ Do not include markdown formatting or explanations outside the JSON.
         Returns:
             dict: Parsed analysis or fallback default.
         """
-        fallback = {
-            "intent": "unknown",
-            "sophistication": "unknown",
-            "recommended_action": "observe",
-            "summary": "LLM analysis failed."
-        }
+        fallback = dict(ANALYSIS_FALLBACK)
         
         if not raw_response:
             return fallback
 
         try:
-            # Clean up potential markdown code blocks
-            clean_response = raw_response.strip()
-            if clean_response.startswith("```json"):
-                clean_response = clean_response[7:]
-            if clean_response.startswith("```"): # Sometimes just ```
-                clean_response = clean_response[3:]
-            if clean_response.endswith("```"):
-                clean_response = clean_response[:-3]
-            
-            clean_response = clean_response.strip()
-            
-            data = json.loads(clean_response)
+            data = self.load_reply(raw_response)
             
             # loose validation
             required_keys = ["intent", "sophistication", "recommended_action", "summary"]
@@ -163,21 +258,30 @@ Do not include markdown formatting or explanations outside the JSON.
                     data[key] = "unknown"
             
             return data
-        except json.JSONDecodeError:
+        except (ValueError, TypeError): # Invalid JSON, or JSON that is not an object
             logger.error(f"Failed to parse LLM JSON: {raw_response[:100]}...")
             return fallback
 
-    def analyze_attacker(self, ip, profile):
+    def analyze_profile(self, ip, profile):
         """
-        Main function to analyze an attacker.
+        Queries the LLM about an attacker profile without modifying it.
         
         Returns:
-            dict: Enriched attacker profile.
+            dict: Parsed analysis, or a copy of ANALYSIS_FALLBACK on failure.
         """
         prompt = self.generate_prompt(ip, profile)
         # Profile analysis takes longer, allow higher output limits
         raw_response = self.send_request(prompt, num_predict=250)
-        analysis = self.parse_response(raw_response)
+        return self.parse_response(raw_response)
+
+    def analyze_attacker(self, ip, profile):
+        """
+        Main function to analyze an attacker.
+        
+        Returns:
+            dict: Enriched attacker profile.
+        """
+        analysis = self.analyze_profile(ip, profile)
         
         # Merge analysis into profile
         profile.update(analysis)
@@ -199,18 +303,14 @@ Do not include markdown formatting or explanations outside the JSON.
         # OPTIMIZATION: Drastically cut token count to reduce inference latency 
         # Only sending the last 3 history commands to save parsing time.
         recent_history = history[-3:] if history else []
-        
-        prompt = f"""
-Evaluate command for SSH Honeypot.
-Cmd: {command}
-Hist: {json.dumps(recent_history)}
-Dir: {filesystem_context.get('path', '/')}
-Action rules: ALLOW recon (ls, pwd). BLOCK destructive (rm, wget).
-If ALLOW, optionally provide decoy file.
-Respond ONLY in this JSON format:
-{{"action":"ALLOW"|"BLOCK","reason":"short","risk_score":50,"dynamic_decoy":{{"should_deploy":true|false,"path":"/dir/file","content":"fake data"}}}}
-"""
-        return prompt
+        # Compact separators: fewer input tokens for the model to read.
+        # str() keeps non-string request fields working as they did in an f-string.
+        return "".join([
+            self._CMD_PROMPT_HEAD, str(command),
+            "\nHist: ", dumps(recent_history).decode('utf-8'),
+            "\nDir: ", str(filesystem_context.get('path', '/')),
+            self._CMD_PROMPT_TAIL
+        ])
 
     def evaluate_command(self, ip, command, history, filesystem_context):
         """
@@ -235,16 +335,7 @@ Respond ONLY in this JSON format:
             return fallback
 
         try:
-            clean_response = raw_response.strip()
-            if clean_response.startswith("```json"):
-                clean_response = clean_response[7:]
-            if clean_response.startswith("```"):
-                clean_response = clean_response[3:]
-            if clean_response.endswith("```"):
-                clean_response = clean_response[:-3]
-            
-            clean_response = clean_response.strip()
-            data = json.loads(clean_response)
+            data = self.load_reply(raw_response)
             
             if "action" not in data or data["action"] not in ["ALLOW", "BLOCK"]:
                 data["action"] = "ALLOW"
@@ -253,7 +344,7 @@ Respond ONLY in this JSON format:
                 data["dynamic_decoy"] = fallback["dynamic_decoy"]
                 
             return data
-        except json.JSONDecodeError:
+        except (ValueError, TypeError): # Invalid JSON, or JSON that is not an object
             logger.error(f"Failed to parse LLM command evaluation JSON: {raw_response[:100]}...")
             return fallback
 
@@ -1,10 +1,10 @@
-import json
 import os
 import sys
 import logging
 from datetime import datetime
 from collections import defaultdict
-import statistics
+from functools import lru_cache
+from operator import itemgetter
 
 # Ensure src/ siblings are importable regardless of CWD
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -13,23 +13,83 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+from json_utils import JSONLTail, dump_file, dump_records, is_json_array, iter_records, load_file
+
 # Try to import patterns from analyzer, or define them if import fails
 try:
     from analyzer import LogAnalyzer
 except ImportError:
     LogAnalyzer = None
 
+# maxminddb is optional: without it, or without a database file, locations are mocked
+try:
+    import maxminddb
+    HAS_MAXMINDDB = True
+except ImportError:
+    HAS_MAXMINDDB = False
+
+GEOIP_DB = os.environ.get('GEOIP_DB', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'GeoLite2-Country.mmdb'))
+
+def open_geoip_reader(path=GEOIP_DB):
+    """
+    Opens the MaxMind database memory-mapped, so it is paged in on demand
+    rather than read onto the heap. Returns None if it is unavailable.
+    """
+    if not HAS_MAXMINDDB or not os.path.exists(path):
+        return None
+    try:
+        return maxminddb.open_database(path, maxminddb.MODE_MMAP)
+    except Exception as e:
+        logger.warning(f"Failed to open GeoIP database {path}: {e}")
+        return None
+
+GEOIP_READER = open_geoip_reader()
+
+@lru_cache(maxsize=100_000)
+def geoip_location(ip):
+    """
+    Continent name for ip from GEOIP_READER, or None if it has no record
+    (private ranges) or the address is invalid. Cached per process, since
+    repeat offenders dominate honeypot logs.
+    """
+    if GEOIP_READER is None:
+        return None
+    try:
+        record = GEOIP_READER.get(ip)
+    except ValueError:
+        return None
+    if not record:
+        return None
+    return record.get('continent', {}).get('names', {}).get('en')
+
 class MetricsGenerator:
     _LOGS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs')
     _DOCS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'docs')
+    # First octet -> mock location (192.168/16 is special-cased in _mock_location)
+    _GEO_TABLE = {
+        '127': "Local Network",
+        '10': "Internal VPN",
+        '1': "North America (Mock)",
+        '2': "Europe (Mock)",
+    }
+    # Bump when the metrics or their saved state change shape, so stale caches are rebuilt
+    _CACHE_VERSION = 2
+    _HEAD_BYTES = 64
 
-    def __init__(self, log_file=None, central_log_file=None):
+    def __init__(self, log_file=None, central_log_file=None, cache_file=None, state_file=None):
         if log_file is None:
-            log_file = os.path.join(self._LOGS_DIR, 'honeypot_logs.json')
+            log_file = os.path.join(self._LOGS_DIR, 'honeypot_logs.jsonl')
         if central_log_file is None:
-            central_log_file = os.path.join(self._LOGS_DIR, 'central_logs.json')
+            central_log_file = os.path.join(self._LOGS_DIR, 'central_logs.jsonl')
         self.log_file = central_log_file if os.path.exists(central_log_file) else log_file
+        if cache_file is None:
+            cache_file = os.path.join(self._LOGS_DIR, '.metrics_cache.json')
+        self.cache_file = cache_file
+        if state_file is None:
+            state_file = os.path.join(self._LOGS_DIR, '.metrics_state.json')
+        self.state_file = state_file
         self.logs = []
+        self._metrics_cache = None # (logs list, metrics) cached by _compute_all_metrics
         self.analyzer = LogAnalyzer(self.log_file) if LogAnalyzer else None
 
     def load_logs(self):
@@ -38,55 +98,198 @@ class MetricsGenerator:
             return []
         
         try:
-            with open(self.log_file, 'r') as f:
-                self.logs = json.load(f)
+            self.logs = list(iter_records(self.log_file))
             return self.logs
         except Exception as e:
             logger.error(f"Error loading logs: {e}")
             return []
 
-    def calculate_dwell_time(self):
+    def stream_logs(self):
         """
-        Calculates dwell time (duration of SHELL_SESSION) per IP.
-        Returns: {ip: {'avg': float, 'max': float, 'sessions': int}}
+        Yields log entries one at a time without keeping them in self.logs.
         """
-        sessions = defaultdict(list)
-        active_sessions = {} # ip -> start_time
+        if not os.path.exists(self.log_file):
+            logger.warning(f"Log file not found: {self.log_file}")
+            return
+        yield from iter_records(self.log_file)
+
+    @classmethod
+    def _mock_location(cls, ip):
+        # In a real system, use GeoIP2 or maxminddb
+        # Here we mock based on IP ranges for demonstration: one dict hit on the first octet
+        first = ip.partition('.')[0]
+        if first == '192':
+            return "Local Network" if ip.startswith('192.168.') else "Unknown"
+        return cls._GEO_TABLE.get(first, "Unknown")
 
-        # Sort logs by timestamp just in case
-        sorted_logs = sorted(self.logs, key=lambda x: x.get('timestamp', ''))
+    @classmethod
+    def _location(cls, ip):
+        if GEOIP_READER is not None:
+            location = geoip_location(ip)
+            if location:
+                return location
+        return cls._mock_location(ip)
 
-        for entry in sorted_logs:
+    def _new_state(self):
+        """
+        Empty accumulators for _fold. Everything is keyed by IP and holds only
+        strings, numbers and the summaries' credential sets, so the state can
+        be saved as JSON and extended with newer events later.
+        """
+        return {
+            'total_events': 0,
+            'locations': {}, # ip -> location, fixed at first sighting
+            'first_seen': {}, # ip -> earliest valid timestamp string
+            'first_block': {}, # ip -> earliest valid BLOCK timestamp string
+            'session_marks': {}, # ip -> [[timestamp_str, is_start]] session start/end only
+            'cmd_counts': {},
+            'summaries': {} # ip -> LogAnalyzer session summary
+        }
+
+    def _fold(self, state, entries):
+        """
+        Folds entries, in any order, into state in a single pass.
+        """
+        locations = state['locations']
+        first_seen = state['first_seen']
+        first_block = state['first_block']
+        session_marks = state['session_marks']
+        cmd_counts = state['cmd_counts']
+        summaries = state['summaries']
+        summarize = self.analyzer.summarize_session if self.analyzer else None
+        total = state['total_events']
+        last_str = None
+
+        for entry in entries:
+            total += 1
             ip = entry.get('ip')
+            if not ip:
+                continue
             event = entry.get('event_type')
+            if ip not in locations:
+                # First sighting of this IP: look its location up once
+                locations[ip] = self._location(ip)
+            if summarize:
+                summaries[ip] = summarize((entry,), summaries.get(ip))
+            if event == 'CMD_EXEC':
+                cmd_counts[ip] = cmd_counts.get(ip, 0) + 1
+
+            # Undated entries only count towards the totals, never the timings
             timestamp_str = entry.get('timestamp')
-            
-            if not ip or not timestamp_str:
+            if not isinstance(timestamp_str, str):
                 continue
+            if event == 'SHELL_SESSION_START' or event == 'SHELL_SESSION_END':
+                # Validated when the sessions are paired in _finalize
+                session_marks.setdefault(ip, []).append([timestamp_str, event == 'SHELL_SESSION_START'])
 
-            try:
-                ts = datetime.fromisoformat(timestamp_str)
-            except ValueError:
+            # Earliest by ISO string, as the old sort was: safe if offsets are mixed.
+            # Only a string earlier than the IP's current first/block time needs
+            # parsing, to make sure it is a valid timestamp.
+            seen = first_seen.get(ip)
+            new_first = seen is None or timestamp_str < seen
+            new_block = False
+            if event == 'BLOCK':
+                blocked = first_block.get(ip)
+                new_block = blocked is None or timestamp_str < blocked
+            if not (new_first or new_block):
                 continue
 
-            if event == 'SHELL_SESSION_START':
-                active_sessions[ip] = ts
-            elif event == 'SHELL_SESSION_END':
-                if ip in active_sessions:
-                    start_ts = active_sessions.pop(ip)
+            # Bursts logged in the same batch share a timestamp: skip the repeat parse
+            if timestamp_str != last_str:
+                try:
+                    datetime.fromisoformat(timestamp_str)
+                except ValueError:
+                    continue
+                last_str = timestamp_str
+
+            if new_first:
+                first_seen[ip] = timestamp_str
+            if new_block:
+                first_block[ip] = timestamp_str
+
+        state['total_events'] = total
+
+    def _finalize(self, state):
+        """
+        Derives the metrics from folded state.
+        """
+        # Sessions pair up per IP, so only each IP's start/end events need ordering.
+        # The sort is stable, giving the same pairs a sort of the whole log would.
+        dwell = {}
+        for ip, marks in state['session_marks'].items():
+            marks.sort(key=itemgetter(0))
+            # Running sum/max/count: no per-IP list of durations
+            total_secs = max_secs = 0.0
+            count = 0
+            start_ts = None
+            for timestamp_str, is_start in marks:
+                try:
+                    ts = datetime.fromisoformat(timestamp_str)
+                except ValueError:
+                    continue
+                if is_start:
+                    start_ts = ts
+                elif start_ts is not None:
                     duration = (ts - start_ts).total_seconds()
-                    sessions[ip].append(duration)
-        
-        # Output stats
-        results = {}
-        for ip, durations in sessions.items():
-            if durations:
-                results[ip] = {
-                    'avg': round(statistics.mean(durations), 2),
-                    'max': round(max(durations), 2),
-                    'sessions': len(durations)
+                    total_secs += duration
+                    if count == 0 or duration > max_secs:
+                        max_secs = duration
+                    count += 1
+                    start_ts = None
+            if count:
+                dwell[ip] = {
+                    'avg': round(total_secs / count, 2),
+                    'max': round(max_secs, 2),
+                    'sessions': count
                 }
-        return results
+
+        first_seen = state['first_seen']
+        blocking = {
+            ip: (datetime.fromisoformat(blocked) - datetime.fromisoformat(first_seen[ip])).total_seconds()
+            for ip, blocked in state['first_block'].items()
+        }
+
+        geo_stats = defaultdict(int)
+        for location in state['locations'].values():
+            geo_stats[location] += 1
+
+        return {
+            'total_events': state['total_events'],
+            'dwell_time': dwell,
+            'blocking_efficiency': blocking,
+            'deception_efficiency': dict(state['cmd_counts']),
+            'geographic_distribution': dict(geo_stats),
+            'summaries': state['summaries']
+        }
+
+    def _compute_all_metrics(self, entries=None):
+        """
+        Computes dwell time, blocking efficiency, deception efficiency, the
+        geographic distribution and the per-IP summaries for classification in
+        a single pass over the logs, in any order.
+        entries defaults to self.logs (cached until self.logs is replaced). Any
+        other iterable, such as stream_logs(), is consumed once without keeping
+        the events.
+        """
+        streaming = entries is not None
+        if not streaming:
+            if self._metrics_cache is not None and self._metrics_cache[0] is self.logs:
+                return self._metrics_cache[1]
+            entries = self.logs
+
+        state = self._new_state()
+        self._fold(state, entries)
+        metrics = self._finalize(state)
+        if not streaming:
+            self._metrics_cache = (self.logs, metrics)
+        return metrics
+
+    def calculate_dwell_time(self):
+        """
+        Calculates dwell time (duration of SHELL_SESSION) per IP.
+        Returns: {ip: {'avg': float, 'max': float, 'sessions': int}}
+        """
+        return self._compute_all_metrics()['dwell_time']
 
     def classify_attacks(self):
         """
@@ -98,18 +301,17 @@ class MetricsGenerator:
             return {}
         
         # Re-use analyzer logic
-        self.analyzer.log_file = self.log_file # Ensure it points to current source
-        grouped = self.analyzer.group_by_ip(self.logs)
-        
+        return self._classify(self._compute_all_metrics()['summaries'])
+
+    def _classify(self, summaries):
         results = {}
-        for ip, events in grouped.items():
+        for ip, summary in summaries.items():
             # Analyzer returns a full dict, we just want patterns
-            analysis = self.analyzer.analyze_session(ip, events)
-            if analysis:
-                results[ip] = {
-                    'patterns': analysis.get('patterns', []),
-                    'risk_score': analysis.get('risk_score', 0)
-                }
+            analysis = self.analyzer.score_session(summary)
+            results[ip] = {
+                'patterns': analysis.get('patterns', []),
+                'risk_score': analysis.get('risk_score', 0)
+            }
         return results
 
     def blocking_efficiency(self):
@@ -117,145 +319,216 @@ class MetricsGenerator:
         Calculates time from First Attempt -> Block.
         Returns: {ip: seconds_to_block}
         """
-        first_seen = {}
-        block_times = {}
-
-        sorted_logs = sorted(self.logs, key=lambda x: x.get('timestamp', ''))
-
-        for entry in sorted_logs:
-            ip = entry.get('ip')
-            event = entry.get('event_type')
-            timestamp_str = entry.get('timestamp')
-            
-            if not ip or not timestamp_str:
-                continue
-            
-            try:
-                ts = datetime.fromisoformat(timestamp_str)
-            except ValueError:
-                continue
-
-            if ip not in first_seen:
-                first_seen[ip] = ts
-            
-            if event == 'BLOCK' and ip not in block_times:
-                block_times[ip] = (ts - first_seen[ip]).total_seconds()
-
-        return block_times
+        return self._compute_all_metrics()['blocking_efficiency']
 
     def deception_efficiency(self):
         """
         Counts CMD_EXEC per IP (proxy for interaction depth).
         Returns: {ip: command_count}
         """
-        counts = defaultdict(int)
-        for entry in self.logs:
-            if entry.get('event_type') == 'CMD_EXEC':
-                ip = entry.get('ip')
-                if ip:
-                    counts[ip] += 1
-        return dict(counts)
+        return self._compute_all_metrics()['deception_efficiency']
 
     def geographic_distribution(self):
         """
-        Mock geographic distribution.
+        Geographic distribution: unique IPs per location. Uses the MaxMind
+        database when available, else the mock table.
+        """
+        return self._compute_all_metrics()['geographic_distribution']
+
+    def _cache_key(self):
+        """
+        Identifies the current contents of the log file by path, mtime and size.
+        Returns None if the file does not exist.
+        """
+        try:
+            stat = os.stat(self.log_file)
+        except OSError:
+            return None
+        return [self._CACHE_VERSION, os.path.abspath(self.log_file), stat.st_mtime_ns, stat.st_size]
+
+    def _load_cached_metrics(self, key):
+        """
+        Returns the metrics cached for key, or None if the cache is missing or stale.
+        """
+        if key is None or not os.path.exists(self.cache_file):
+            return None
+        try:
+            cached = load_file(self.cache_file)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable metrics cache {self.cache_file}: {e}")
+            return None
+        if not isinstance(cached, dict) or cached.get('key') != key:
+            return None
+        return cached.get('metrics')
+
+    def _save_cached_metrics(self, key, metrics):
+        if key is None:
+            return
+        try:
+            dump_file({'key': key, 'metrics': metrics}, self.cache_file, indent=False)
+        except Exception as e:
+            logger.warning(f"Failed to save metrics cache: {e}")
+
+    def _log_head(self, size=None):
+        """
+        Hex of the first bytes of the log file, used to tell an appended-to
+        file from a rotated or rewritten one.
+        """
+        with open(self.log_file, 'rb') as f:
+            return f.read(self._HEAD_BYTES if size is None else size).hex()
+
+    def _load_state(self):
+        """
+        Returns (state, offset) saved by the last report for the current log
+        file, or a fresh state and offset 0 if there is none or the file has
+        been truncated, rotated or rewritten since.
+        """
+        try:
+            saved = load_file(self.state_file)
+            key = [self._CACHE_VERSION, os.path.abspath(self.log_file)]
+            if saved.get('key') == key and saved['offset'] <= os.path.getsize(self.log_file) \
+                    and saved['head'] == self._log_head(len(saved['head']) // 2):
+                state = saved['state']
+                for summary in state['summaries'].values():
+                    summary['usernames'] = set(summary['usernames'])
+                    summary['passwords'] = set(summary['passwords'])
+                return state, saved['offset']
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable metrics state {self.state_file}: {e}")
+        return self._new_state(), 0
+
+    def _save_state(self, state, offset):
+        summaries = {
+            ip: dict(summary, usernames=list(summary['usernames']), passwords=list(summary['passwords']))
+            for ip, summary in state['summaries'].items()
+        }
+        saved = {
+            'key': [self._CACHE_VERSION, os.path.abspath(self.log_file)],
+            'offset': offset,
+            'head': self._log_head(),
+            'state': dict(state, summaries=summaries)
+        }
+        try:
+            dump_file(saved, self.state_file, indent=False)
+        except Exception as e:
+            logger.warning(f"Failed to save metrics state: {e}")
+
+    def _report_metrics(self):
+        """
+        Computes every metric in the report. For a JSONL log only the events
+        appended since the last report are read, folded into the saved state.
+        """
+        state = self._new_state()
+        if not os.path.exists(self.log_file):
+            logger.warning(f"Log file not found: {self.log_file}")
+        elif is_json_array(self.log_file):
+            # Legacy arrays are rewritten whole, so they are always read in full
+            self._fold(state, self.stream_logs())
+        else:
+            state, offset = self._load_state()
+            tail = JSONLTail(self.log_file, offset)
+            self._fold(state, tail)
+            self._save_state(state, tail.offset)
+        computed = self._finalize(state)
+
+        if self.analyzer:
+            classification = self._classify(computed['summaries'])
+        else:
+            logger.warning("Analyzer module not available for classification.")
+            classification = {}
+
+        return {
+            'total_events': computed['total_events'],
+            'dwell_time': computed['dwell_time'],
+            'attack_classification': classification,
+            'blocking_efficiency': computed['blocking_efficiency'],
+            'deception_efficiency': computed['deception_efficiency'],
+            'geographic_distribution': computed['geographic_distribution']
+        }
+
+    @staticmethod
+    def _metric_records(metrics):
+        """
+        Flattens the report into one record per metric row for JSONL output.
+        """
+        yield {'metric': 'summary', 'generated_at': metrics['generated_at'], 'total_events': metrics['total_events']}
+        for ip, data in metrics['dwell_time'].items():
+            yield {'metric': 'dwell_time', 'ip': ip, **data}
+        for ip, data in metrics['attack_classification'].items():
+            yield {'metric': 'attack_classification', 'ip': ip, **data}
+        for ip, seconds in metrics['blocking_efficiency'].items():
+            yield {'metric': 'blocking_efficiency', 'ip': ip, 'value': seconds}
+        for ip, count in metrics['deception_efficiency'].items():
+            yield {'metric': 'deception_efficiency', 'ip': ip, 'value': count}
+        for location, count in metrics['geographic_distribution'].items():
+            yield {'metric': 'geographic_distribution', 'location': location, 'value': count}
+
+    def generate_report(self, output_json=None, output_md=None, jsonl=False):
+        """
+        Writes the metrics as JSON and the Markdown report.
+        jsonl=True writes the JSON output as one compact record per metric row
+        instead, for line-oriented consumers (SIEM ingestion, tail -f).
         """
-        # In a real system, use GeoIP2 or maxminddb
-        # Here we mock based on IP ranges for demonstration
-        geo_stats = defaultdict(int)
-        for entry in self.logs:
-            ip = entry.get('ip')
-            if not ip: continue
-            
-            # Simple mock mapping
-            if ip.startswith('192.168.') or ip.startswith('127.'):
-                location = "Local Network"
-            elif ip.startswith('10.'):
-                location = "Internal VPN"
-            elif ip.startswith('1.'):
-                location = "North America (Mock)"
-            elif ip.startswith('2.'):
-                location = "Europe (Mock)"
-            else:
-                location = "Unknown"
-            
-            # Count unique IPs per location? Or total events? 
-            # Usually unique IPs per location is more interesting.
-            pass 
-            
-        # Re-iterate for unique IPs
-        unique_ips = set(entry.get('ip') for entry in self.logs if entry.get('ip'))
-        for ip in unique_ips:
-             if ip.startswith('192.168.') or ip.startswith('127.'):
-                location = "Local Network"
-             elif ip.startswith('10.'):
-                location = "Internal VPN"
-             elif ip.startswith('1.'):
-                location = "North America (Mock)"
-             elif ip.startswith('2.'):
-                location = "Europe (Mock)"
-             else:
-                location = "Unknown"
-             geo_stats[location] += 1
-             
-        return dict(geo_stats)
-
-    def generate_report(self, output_json=None, output_md=None):
         if output_json is None:
-            output_json = os.path.join(self._LOGS_DIR, 'experiment_metrics.json')
+            # Not experiment_metrics.jsonl: that is the controller's live dashboard feed
+            output_json = os.path.join(self._LOGS_DIR, 'experiment_report.jsonl' if jsonl else 'experiment_metrics.json')
         if output_md is None:
             output_md = os.path.join(self._DOCS_DIR, 'analysis_report.md')
-        self.load_logs()
-        
-        metrics = {
-            'generated_at': datetime.now().isoformat(),
-            'total_events': len(self.logs),
-            'dwell_time': self.calculate_dwell_time(),
-            'attack_classification': self.classify_attacks(),
-            'blocking_efficiency': self.blocking_efficiency(),
-            'deception_efficiency': self.deception_efficiency(),
-            'geographic_distribution': self.geographic_distribution()
-        }
+
+        # Reuse the last computation while the log file is unchanged
+        key = self._cache_key()
+        computed = self._load_cached_metrics(key)
+        if computed is None:
+            computed = self._report_metrics()
+            self._save_cached_metrics(key, computed)
+        else:
+            logger.info(f"Log file unchanged, reusing cached metrics from {self.cache_file}")
+
+        metrics = {'generated_at': datetime.now().isoformat(), **computed}
 
         # Save JSON
         try:
-            with open(output_json, 'w') as f:
-                json.dump(metrics, f, indent=4)
+            if jsonl:
+                dump_records(self._metric_records(metrics), output_json)
+            else:
+                dump_file(metrics, output_json)
             logger.info(f"Metrics saved to {output_json}")
         except Exception as e:
             logger.error(f"Failed to save JSON metrics: {e}")
 
         # Save Markdown
         try:
+            # Build the whole report in memory and write it once
+            parts = [
+                "# Honeypot Experiment Report\n",
+                f"**Generated:** {metrics['generated_at']}\n",
+                f"**Total Events:** {metrics['total_events']}\n\n",
+
+                "## 1. Dwell Time Analysis\n",
+                "| IP | Sessions | Avg Duration (s) | Max Duration (s) |\n",
+                "|---|---|---|---|\n",
+            ]
+            parts.extend(f"| {ip} | {data['sessions']} | {data['avg']} | {data['max']} |\n" for ip, data in metrics['dwell_time'].items())
+
+            parts.append("\n## 2. Deception Efficiency (Interaction Depth)\n")
+            parts.append("| IP | Commands Executed |\n")
+            parts.append("|---|---|\n")
+            parts.extend(f"| {ip} | {count} |\n" for ip, count in metrics['deception_efficiency'].items())
+
+            parts.append("\n## 3. Blocking Efficiency\n")
+            parts.append("| IP | Time to Block (s) |\n")
+            parts.append("|---|---|\n")
+            parts.extend(f"| {ip} | {round(seconds, 2)} |\n" for ip, seconds in metrics['blocking_efficiency'].items())
+
+            parts.append("\n## 4. Attack Classification\n")
+            parts.append("| IP | Risk Score | Patterns |\n")
+            parts.append("|---|---|---|\n")
+            parts.extend(f"| {ip} | {data['risk_score']} | {', '.join(data['patterns'])} |\n" for ip, data in metrics['attack_classification'].items())
+
             with open(output_md, 'w') as f:
-                f.write(f"# Honeypot Experiment Report\n")
-                f.write(f"**Generated:** {metrics['generated_at']}\n")
-                f.write(f"**Total Events:** {metrics['total_events']}\n\n")
-
-                f.write("## 1. Dwell Time Analysis\n")
-                f.write("| IP | Sessions | Avg Duration (s) | Max Duration (s) |\n")
-                f.write("|---|---|---|---|\n")
-                for ip, data in metrics['dwell_time'].items():
-                    f.write(f"| {ip} | {data['sessions']} | {data['avg']} | {data['max']} |\n")
-                
-                f.write("\n## 2. Deception Efficiency (Interaction Depth)\n")
-                f.write("| IP | Commands Executed |\n")
-                f.write("|---|---|\n")
-                for ip, count in metrics['deception_efficiency'].items():
-                    f.write(f"| {ip} | {count} |\n")
-
-                f.write("\n## 3. Blocking Efficiency\n")
-                f.write("| IP | Time to Block (s) |\n")
-                f.write("|---|---|\n")
-                for ip, seconds in metrics['blocking_efficiency'].items():
-                    f.write(f"| {ip} | {round(seconds, 2)} |\n")
-                
-                f.write("\n## 4. Attack Classification\n")
-                f.write("| IP | Risk Score | Patterns |\n")
-                f.write("|---|---|---|\n")
-                for ip, data in metrics['attack_classification'].items():
-                    patterns = ", ".join(data['patterns'])
-                    f.write(f"| {ip} | {data['risk_score']} | {patterns} |\n")
+                f.write("".join(parts))
             
             logger.info(f"Report saved to {output_md}")
         except Exception as e:
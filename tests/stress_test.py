@@ -1,5 +1,5 @@
+import asyncio
 import socket
-import threading
 import time
 import sys
 
@@ -30,27 +30,27 @@ def stress_test_rapid(count=50):
     duration = time.time() - start
     print(f"Completed {count} connections in {duration:.2f}s. Errors: {errors}")
 
+async def open_connection(i):
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(HOST, PORT), timeout=2)
+        return writer
+    except Exception as e:
+        print(f"Failed to connect at {i}: {e}")
+        return None
+
+async def hold_connections(count):
+    # Open every connection at once on one event loop, hold them, then close
+    writers = [w for w in await asyncio.gather(*(open_connection(i) for i in range(count))) if w]
+    print(f"Held {len(writers)} open connections.")
+    await asyncio.sleep(2)
+    print("Closing connections...")
+    for w in writers:
+        w.close()
+
 def stress_test_concurrency(count=60):
     print(f"--- Concurrency Test ({count}) ---")
-    sockets = []
     print("Opening connections...")
-    for i in range(count):
-        try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s.settimeout(2)
-            s.connect((HOST, PORT))
-            sockets.append(s)
-        except Exception as e:
-            print(f"Failed to connect at {i}: {e}")
-            
-    print(f"Held {len(sockets)} open connections.")
-    time.sleep(2)
-    print("Closing connections...")
-    for s in sockets:
-        try:
-            s.close()
-        except:
-            pass
+    asyncio.run(hold_connections(count))
 
 def main():
     print("Starting Stress Test...")
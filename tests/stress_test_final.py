@@ -1,12 +1,12 @@
+import asyncio
 import threading
-import socket
 import time
 import logging
 import paramiko
 import os
 import signal
 from unittest.mock import patch
-from honeypot import start_server, SERVER_RUNNING, BLOCKED_IPS, GLOBAL_BLOCKED_IPS
+from honeypot import start_server, SERVER_RUNNING, BLOCKED_IPS
 import honeypot
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
@@ -16,14 +16,10 @@ HOST = '127.0.0.1'
 PORT = 2222
 CONCURRENT_CONNECTIONS = 50
 
-success_count = 0
-fail_count = 0
-lock = threading.Lock()
-
 def start_infrastructure():
     # Clear any existing blocks
     BLOCKED_IPS.clear()
-    GLOBAL_BLOCKED_IPS.clear()
+    honeypot.GLOBAL_BLOCKED_IPS = frozenset()
     
     logger.info("Starting Honeypot Server...")
     # signal.signal only works in main thread. We patch it for this test.
@@ -32,41 +28,36 @@ def start_infrastructure():
         t.start()
     time.sleep(2) # Wait for startup
 
-def attempt_connection(idx):
-    global success_count, fail_count
+async def attempt_connection(idx):
+    """
+    Opens one connection and reads the banner. Returns True if it was an SSH banner.
+    """
     try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.settimeout(3)
-        s.connect((HOST, PORT))
-        banner = s.recv(1024)
-        if b"SSH" in banner:
-             with lock:
-                 success_count += 1
-        else:
-             with lock:
-                fail_count += 1
-        s.close()
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(HOST, PORT), timeout=3)
+        try:
+            banner = await asyncio.wait_for(reader.read(1024), timeout=3)
+        finally:
+            writer.close()
+        return b"SSH" in banner
     except Exception as e:
         logger.error(f"Connection failed: {e}")
-        with lock:
-            fail_count += 1
+        return False
+
+async def run_connections(count):
+    # All connections wait on one event loop instead of one thread each
+    return await asyncio.gather(*(attempt_connection(i) for i in range(count)))
 
 def run_stress_test():
     # Start Server
     start_infrastructure()
 
-    threads = []
     start_time = time.time()
     
     logger.info(f"Starting stress test with {CONCURRENT_CONNECTIONS} concurrent connections...")
     
-    for i in range(CONCURRENT_CONNECTIONS):
-        t = threading.Thread(target=attempt_connection, args=(i,))
-        threads.append(t)
-        t.start()
-        
-    for t in threads:
-        t.join()
+    results = asyncio.run(run_connections(CONCURRENT_CONNECTIONS))
+    success_count = sum(results)
+    fail_count = len(results) - success_count
         
     duration = time.time() - start_time
     logger.info(f"Test completed in {duration:.2f}s")
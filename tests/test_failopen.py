@@ -3,6 +3,12 @@ import time
 import subprocess
 import os
 import signal
+from requests.adapters import HTTPAdapter
+
+# One keep-alive connection reused by every request in this module
+SESSION = requests.Session()
+SESSION.headers.update({'X-API-KEY': 'default-secure-key', 'Content-Type': 'application/json'})
+SESSION.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
 
 def test_dynamic_decoy():
     print("Starting integration test for Fail-Open AI evaluation and Dynamic Decoy...")
@@ -14,7 +20,6 @@ def test_dynamic_decoy():
     try:
         # 2. Test Proxy with Brain offline (Fail-open latency test)
         print("Testing Fail-Open (Brain is offline)...")
-        headers = {'X-API-KEY': 'default-secure-key', 'Content-Type': 'application/json'}
         payload = {
             "ip": "1.1.1.1",
             "command": "cat /etc/passwd",
@@ -24,7 +29,7 @@ def test_dynamic_decoy():
         
         start = time.time()
         try:
-            resp = requests.post("http://127.0.0.1:5000/evaluate_command", json=payload, headers=headers, timeout=5)
+            resp = SESSION.post("http://127.0.0.1:5000/evaluate_command", json=payload, timeout=5)
             data = resp.json()
             elapsed = time.time() - start
             print(f"Fail-Open Response: {data}")
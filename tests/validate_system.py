@@ -1,14 +1,17 @@
 import threading
 import time
 import os
-import json
+import socket
 import requests
 import paramiko
 import logging
-from controller_server import app as controller_app, BLOCKED_IPS
+import select
+from controller_server import app as controller_app, unblock
 from honeypot import start_server as start_honeypot, SERVER_RUNNING, CLIENT_THREADS, log_writer, blocklist_syncer
+import controller_server
 import honeypot
 import metrics
+from json_utils import loads
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -30,17 +33,51 @@ def run_honeypot():
     honeypot.SENSOR_ID = "test-sensor"
     start_honeypot()
 
-def wait_for_port(port, timeout=10):
-    start = time.time()
-    while time.time() - start < timeout:
-        try:
-            with socket.create_connection(('127.0.0.1', port), timeout=1):
-                return True
-        except:
-            time.sleep(0.5)
-    return False
+TAIL_BYTES = 65536 # The events under test are always among the most recent
+
+def wait_until(condition, timeout=5):
+    # Try immediately, then back off from 10ms up to 100ms between attempts
+    deadline = time.monotonic() + timeout
+    delay = 0.01
+    while True:
+        if condition():
+            return True
+        if time.monotonic() + delay > deadline:
+            return False
+        time.sleep(delay)
+        delay = min(delay * 2, 0.1)
+
+def port_open(port):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.settimeout(1)
+        return s.connect_ex(('127.0.0.1', port)) == 0
 
-import socket
+def wait_for_port(port, timeout=10):
+    return wait_until(lambda: port_open(port), timeout)
+
+def drain(chan, expect=(), idle=0.1, timeout=5):
+    """
+    Reads from chan until every string in expect has arrived and no more output
+    follows within idle seconds, or until timeout.
+    """
+    output = b''
+    wanted = [e.encode('utf-8') for e in expect]
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        done = all(w in output for w in wanted)
+        readable, _, _ = select.select([chan], [], [], min(idle, remaining) if done else remaining)
+        if not readable:
+            if done:
+                break
+            continue
+        data = chan.recv(4096)
+        if not data:
+            break
+        output += data
+    return output.decode('utf-8', errors='replace')
 
 class SystemValidator:
     def __init__(self):
@@ -60,30 +97,35 @@ class SystemValidator:
         self.honeypot_thread = threading.Thread(target=run_honeypot, daemon=True)
         self.honeypot_thread.start()
         
-        if not wait_for_port(HONEYPOT_PORT):
+        if not wait_for_port(HONEYPOT_PORT) or not honeypot.READY_EVENT.wait(5):
              logger.error("Honeypot failed to start")
              return False
-             
-        time.sleep(2) # Stabilize
         return True
 
     def test_brute_force_block(self):
         logger.info("[TEST] Scenario 1: Brute Force Blocking")
         honeypot.ALLOW_ALL_CREDS = False
-        client = paramiko.SSHClient()
-        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
         
-        # 1. 6 Failed attempts
+        # 1. 6 Failed attempts over one SSH transport (one TCP + key exchange);
+        # reconnect only if the honeypot drops the connection
+        transport = None
         for i in range(6):
             try:
-                client.connect('127.0.0.1', port=HONEYPOT_PORT, username='admin', password=f'wrong{i}', timeout=2)
+                if transport is None or not transport.is_active():
+                    if transport is not None:
+                        transport.close()
+                    transport = paramiko.Transport(('127.0.0.1', HONEYPOT_PORT))
+                    transport.start_client(timeout=2)
+                transport.auth_password('admin', f'wrong{i}')
             except paramiko.AuthenticationException:
                 pass # Expected
             except Exception as e:
                 logger.warning(f"Connection error: {e}")
-            client.close()
+        if transport is not None:
+            transport.close()
         
-        time.sleep(2) # Wait for log processing and sync
+        # Wait for the BLOCK event to reach the controller
+        wait_until(lambda: '127.0.0.1' in controller_server.BLOCKED_IPS)
         
         # 2. Verify Global Blocklist
         try:
@@ -103,14 +145,12 @@ class SystemValidator:
         honeypot.ALLOW_ALL_CREDS = True
         
         # Clear Blocklists (Controller + Honeypot Local + Honeypot Global)
-        if '127.0.0.1' in BLOCKED_IPS:
-            BLOCKED_IPS.remove('127.0.0.1')
+        unblock('127.0.0.1')
         if '127.0.0.1' in honeypot.BLOCKED_IPS:
             del honeypot.BLOCKED_IPS['127.0.0.1']
         if '127.0.0.1' in honeypot.GLOBAL_BLOCKED_IPS:
-             honeypot.GLOBAL_BLOCKED_IPS.remove('127.0.0.1')
-             
-        time.sleep(2) # Allow threads to see state change if needed
+             honeypot.GLOBAL_BLOCKED_IPS = honeypot.GLOBAL_BLOCKED_IPS - {'127.0.0.1'}
+        # Blocklist reads are unlocked and take effect on the next login, no wait needed
              
         client = paramiko.SSHClient()
         client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
@@ -119,24 +159,18 @@ class SystemValidator:
             client.connect('127.0.0.1', port=HONEYPOT_PORT, username='root', password='password', timeout=5)
             chan = client.invoke_shell()
             
-            # Send commands
+            # Send commands back to back, then read until both outputs are in
             chan.send("ls /\n")
-            time.sleep(1)
             chan.send("whoami\n")
-            time.sleep(1)
-            
-            output = ""
-            while chan.recv_ready():
-                output += chan.recv(4096).decode('utf-8')
+            output = drain(chan, expect=("etc", "root"))
             if "etc" in output and "root" in output:
                 logger.info("PASS: Shell Interaction Successful")
             else:
                 logger.error(f"FAIL: Unexpected output: {output}")
                 
             client.close()
-            time.sleep(2)
             
-            # Verify Logs
+            # Verify Logs (check_log_event waits for the log writer to catch up)
             self.check_log_event('SHELL_SESSION_START', '127.0.0.1')
             self.check_log_event('CMD_EXEC', '127.0.0.1')
             
@@ -146,7 +180,7 @@ class SystemValidator:
     def test_reporting(self):
         logger.info("[TEST] Scenario 3: Reporting")
         try:
-            gen = metrics.MetricsGenerator(log_file='logs/honeypot_logs.json', central_log_file='logs/central_logs.json')
+            gen = metrics.MetricsGenerator(log_file='logs/honeypot_logs.jsonl', central_log_file='logs/central_logs.jsonl')
             gen.generate_report()
             
             if os.path.exists('logs/experiment_metrics.json') and os.path.exists('docs/analysis_report.md'):
@@ -156,23 +190,42 @@ class SystemValidator:
         except Exception as e:
             logger.error(f"FAIL: Reporting exception: {e}")
 
-    def check_log_event(self, event_type, ip):
-        # Check central logs first, then local
-        found = False
-        files = ['logs/central_logs.json', 'logs/honeypot_logs.json']
-        for fname in files:
-            if not os.path.exists(fname): continue
-            try:
-                with open(fname, 'r') as f:
-                    logs = json.load(f)
-                    for entry in logs:
-                        if entry['event_type'] == event_type and entry['ip'] == ip:
-                            found = True
-                            break
-            except: pass
-        
-        if found:
+    def _event_seen(self, event_type, ip):
+        try:
+            resp = requests.get(f"http://127.0.0.1:{CONTROLLER_PORT}/events", params={'event_type': event_type, 'ip': ip}, headers={'X-API-KEY': controller_server.API_KEY}, timeout=2)
+            return resp.json()['found']
+        except Exception as e:
+            logger.warning(f"Could not query controller events: {e}")
+            return False
+
+    def _event_in_local_log(self, event_type, ip, tail_bytes=TAIL_BYTES):
+        """
+        Scans the last tail_bytes of the honeypot's own log, for events that were
+        written locally but never reached the controller.
+        """
+        try:
+            with open(honeypot.LOG_FILE, 'rb') as f:
+                if os.fstat(f.fileno()).st_size > tail_bytes:
+                    f.seek(-tail_bytes, os.SEEK_END)
+                    f.readline() # Discard the partial first line
+                for line in f:
+                    try:
+                        entry = loads(line)
+                    except ValueError:
+                        continue
+                    if entry.get('event_type') == event_type and entry.get('ip') == ip:
+                        return True
+        except OSError as e:
+            logger.warning(f"Could not read {honeypot.LOG_FILE}: {e}")
+        return False
+
+    def check_log_event(self, event_type, ip, timeout=5):
+        # Asks the controller, which indexes every event it receives, until the event shows up or timeout;
+        # then falls back to the honeypot's local log
+        if wait_until(lambda: self._event_seen(event_type, ip), timeout):
             logger.info(f"PASS: Logged {event_type} for {ip}")
+        elif self._event_in_local_log(event_type, ip):
+            logger.warning(f"PASS: Logged {event_type} for {ip} locally, but the controller never received it")
         else:
              logger.error(f"FAIL: No {event_type} log found for {ip}")
 